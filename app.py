@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
-from datetime import datetime
-import time
-import pandas as pd
-from database import init_supabase, cache_stock_data, get_cached_stock_data, save_watchlist, get_watchlist, get_popular_stocks
+from database import init_storage, storage_backend_name, get_database_status, get_session_watchlist, add_to_watchlist, remove_from_watchlist, clear_watchlist, import_watchlist, export_watchlist, get_popular_stocks
+from stock_fetcher import fetch_stocks
+from summary import build_summary, summary_column_config
+from export import export_controls
+from settings import server_api_key
 import uuid
 
 st.set_page_config(page_title="Stock Price Tracker", page_icon="📈", layout="wide")
@@ -48,18 +48,15 @@ st.markdown("""
 
 # Title and description
 st.title("📈 Stock Price Tracker")
-st.markdown("Get real-time stock prices and 52-week high/low analysis - Processing one by one")
+st.markdown("Get real-time stock prices and 52-week high/low analysis - Concurrent processing")
 
 # Initialize database connection
-supabase = init_supabase()
+supabase = init_storage()
 
 # Initialize session state
 if 'api_key' not in st.session_state:
-    # Try to get API key from secrets first
-    try:
-        st.session_state.api_key = st.secrets["ALPHA_VANTAGE_API_KEY"]
-    except:
-        st.session_state.api_key = None
+    # Try the server's key from secrets or the environment first
+    st.session_state.api_key = server_api_key()
 
 if 'user_id' not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
@@ -67,102 +64,37 @@ if 'user_id' not in st.session_state:
 if 'processed_stocks' not in st.session_state:
     st.session_state.processed_stocks = []
 
-def get_stock_info(ticker_symbol):
-    if not st.session_state.api_key:
-        st.error("""
-        Please enter your Alpha Vantage API key. You can get a free API key at:
-        https://www.alphavantage.co/support/#api-key
-        
-        It's free and takes just a minute to register!
-        """)
-        return None
-    
-    # Try to get cached data first
-    cached_data = get_cached_stock_data(supabase, ticker_symbol)
-    if cached_data:
-        st.info(f"📊 Using cached data for {ticker_symbol} (updated within last 15 minutes)")
-        return cached_data
-        
-    try:
-        # Get Global Quote
-        quote_url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-        quote_response = requests.get(quote_url)
-        quote_data = quote_response.json()
-        
-        if "Global Quote" in quote_data and quote_data["Global Quote"]:
-            current_price = float(quote_data["Global Quote"]["05. price"])
-            
-            # Get Company Overview for the name
-            overview_url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-            overview_response = requests.get(overview_url)
-            overview_data = overview_response.json()
-            
-            company_name = overview_data.get("Name", ticker_symbol)
-            
-            # Get Weekly Adjusted Time Series for 52-week high/low
-            weekly_url = f"https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-            weekly_response = requests.get(weekly_url)
-            weekly_data = weekly_response.json()
-            
-            if "Weekly Adjusted Time Series" in weekly_data:
-                # Get data from the last 52 weeks
-                highs = []
-                lows = []
-                count = 0
-                for date in sorted(weekly_data["Weekly Adjusted Time Series"].keys(), reverse=True):
-                    if count < 52:  # Only look at last 52 weeks
-                        lows.append(float(weekly_data["Weekly Adjusted Time Series"][date]["3. low"]))
-                        highs.append(float(weekly_data["Weekly Adjusted Time Series"][date]["2. high"]))
-                        count += 1
-                    else:
-                        break
-                
-                fifty_two_week_low = min(lows) if lows else None
-                fifty_two_week_high = max(highs) if highs else None
-                
-                if fifty_two_week_low and fifty_two_week_high:
-                    stock_data = {
-                        'symbol': ticker_symbol,
-                        'current_price': current_price,
-                        '52_week_low': fifty_two_week_low,
-                        '52_week_high': fifty_two_week_high,
-                        'company_name': company_name,
-                        'status': 'success'
-                    }
-                    
-                    # Cache the data
-                    cache_stock_data(supabase, ticker_symbol, stock_data)
-                    
-                    return stock_data
-        
-        return {'symbol': ticker_symbol, 'status': 'error', 'error': 'No data available'}
-        
-    except Exception as e:
-        return {'symbol': ticker_symbol, 'status': 'error', 'error': str(e)}
+def display_cache_badge(stock_data):
+    """Show how old cached data is, flagging stale rows that are being refreshed"""
+    age_minutes = int(stock_data.age_minutes)
+    if stock_data.stale:
+        st.warning(f"🕒 Showing {stock_data.symbol} data from {age_minutes} minutes ago while fresh data loads in the background")
+    else:
+        st.info(f"📊 Using cached data for {stock_data.symbol} (updated {age_minutes} minutes ago)")
 
 def display_stock_info(stock_data):
-    if stock_data and stock_data.get('status') == 'success':
+    if stock_data and stock_data.ok:
         # Display company name in a header
-        st.subheader(f"📊 {stock_data['company_name']} ({stock_data['symbol']})")
+        st.subheader(f"📊 {stock_data.company_name} ({stock_data.symbol})")
         
         # First row: Current Price
-        st.metric("Current Price", f"${stock_data['current_price']:.2f}")
+        st.metric("Current Price", f"${stock_data.current_price:.2f}")
         
         # Second row: 52 Week Range
         col1, col2 = st.columns(2)
         
         with col1:
-            st.metric("52 Week Low", f"${stock_data['52_week_low']:.2f}")
+            st.metric("52 Week Low", f"${stock_data.week_52_low:.2f}")
         with col2:
-            st.metric("52 Week High", f"${stock_data['52_week_high']:.2f}")
+            st.metric("52 Week High", f"${stock_data.week_52_high:.2f}")
         
         # Third row: Performance Metrics
         col1, col2 = st.columns(2)
         
         with col1:
             # Calculate how far above 52-week low
-            diff_low = stock_data['current_price'] - stock_data['52_week_low']
-            diff_low_percent = (diff_low / stock_data['52_week_low']) * 100
+            diff_low = stock_data.current_price - stock_data.week_52_low
+            diff_low_percent = (diff_low / stock_data.week_52_low) * 100
             st.metric(
                 "Above 52W Low", 
                 f"{diff_low_percent:.1f}%",
@@ -171,8 +103,8 @@ def display_stock_info(stock_data):
         
         with col2:
             # Calculate how far below 52-week high
-            diff_high = stock_data['current_price'] - stock_data['52_week_high']
-            diff_high_percent = (diff_high / stock_data['52_week_high']) * 100
+            diff_high = stock_data.current_price - stock_data.week_52_high
+            diff_high_percent = (diff_high / stock_data.week_52_high) * 100
             st.metric(
                 "Below 52W High", 
                 f"{abs(diff_high_percent):.1f}%",
@@ -183,50 +115,15 @@ def display_stock_info(stock_data):
         # Add analysis section
         st.markdown("### 📈 Price Analysis")
         st.markdown(f"""
-        - Current price is **${stock_data['current_price']:.2f}**
-        - **{diff_low_percent:.1f}%** above 52-week low of ${stock_data['52_week_low']:.2f}
-        - **{abs(diff_high_percent):.1f}%** below 52-week high of ${stock_data['52_week_high']:.2f}
+        - Current price is **${stock_data.current_price:.2f}**
+        - **{diff_low_percent:.1f}%** above 52-week low of ${stock_data.week_52_low:.2f}
+        - **{abs(diff_high_percent):.1f}%** below 52-week high of ${stock_data.week_52_high:.2f}
         """)
         
         # Add divider
         st.markdown("<div class='stock-divider'></div>", unsafe_allow_html=True)
     else:
-        st.error(f"❌ Failed to fetch data for {stock_data['symbol']}: {stock_data.get('error', 'Unknown error')}")
-
-def create_summary_table(processed_stocks):
-    """Create a summary table of all processed stocks"""
-    if not processed_stocks:
-        return None
-    
-    summary_data = []
-    for stock in processed_stocks:
-        if stock.get('status') == 'success':
-            diff_low_percent = ((stock['current_price'] - stock['52_week_low']) / stock['52_week_low']) * 100
-            diff_high_percent = ((stock['current_price'] - stock['52_week_high']) / stock['52_week_high']) * 100
-            
-            summary_data.append({
-                'Symbol': stock['symbol'],
-                'Company': stock['company_name'],
-                'Current Price': f"${stock['current_price']:.2f}",
-                '52W Low': f"${stock['52_week_low']:.2f}",
-                '52W High': f"${stock['52_week_high']:.2f}",
-                'Above Low %': f"{diff_low_percent:.1f}%",
-                'Below High %': f"{abs(diff_high_percent):.1f}%",
-                'Status': '✅ Success'
-            })
-        else:
-            summary_data.append({
-                'Symbol': stock['symbol'],
-                'Company': 'N/A',
-                'Current Price': 'N/A',
-                '52W Low': 'N/A',
-                '52W High': 'N/A',
-                'Above Low %': 'N/A',
-                'Below High %': 'N/A',
-                'Status': f"❌ {stock.get('error', 'Error')}"
-            })
-    
-    return pd.DataFrame(summary_data)
+        st.error(f"❌ Failed to fetch data for {stock_data.symbol}: {stock_data.error or 'Unknown error'}")
 
 # Sidebar
 st.sidebar.title("🔧 Configuration")
@@ -241,7 +138,10 @@ else:
 
 # Database status
 if supabase:
-    st.sidebar.success("Database connected! ✅")
+    st.sidebar.success(f"Database connected ({storage_backend_name(supabase)})! ✅")
+    db_status = get_database_status(supabase)
+    if db_status and db_status["state"] != "closed":
+        st.sidebar.warning(f"Database unavailable, using in-memory data ({db_status['state']}): {db_status['last_error']}")
 else:
     st.sidebar.warning("Database not connected (optional)")
 
@@ -254,7 +154,7 @@ if st.sidebar.button("Clear Results"):
 # Watchlist management
 st.sidebar.title("📝 Watchlist")
 if supabase:
-    current_watchlist = get_watchlist(supabase, st.session_state.user_id)
+    current_watchlist = get_session_watchlist(supabase, st.session_state.user_id)
     
     if current_watchlist:
         st.sidebar.subheader("Your Watchlist:")
@@ -269,14 +169,36 @@ if supabase:
     new_symbol = st.sidebar.text_input("Add symbol to watchlist:").upper()
     if st.sidebar.button("Add to Watchlist") and new_symbol:
         if new_symbol not in current_watchlist:
-            current_watchlist.append(new_symbol)
-            if save_watchlist(supabase, st.session_state.user_id, current_watchlist):
+            if add_to_watchlist(supabase, st.session_state.user_id, new_symbol):
                 st.sidebar.success(f"Added {new_symbol}!")
                 st.rerun()
     
+    # Remove from watchlist
+    if current_watchlist:
+        remove_symbol = st.sidebar.selectbox("Remove symbol from watchlist:", current_watchlist)
+        if st.sidebar.button("Remove from Watchlist"):
+            if remove_from_watchlist(supabase, st.session_state.user_id, remove_symbol):
+                st.rerun()
+    
+    # Bulk import/export
+    with st.sidebar.expander("Import / Export"):
+        import_text = st.text_area("Symbols to import (comma or newline separated):")
+        replace_watchlist = st.checkbox("Replace current watchlist")
+        if st.button("Import") and import_text:
+            symbols = import_text.replace("\n", ",").split(",")
+            if import_watchlist(supabase, st.session_state.user_id, symbols, replace=replace_watchlist) is not None:
+                st.rerun()
+        if current_watchlist:
+            st.download_button(
+                label="📥 Export Watchlist (CSV)",
+                data=export_watchlist(current_watchlist),
+                file_name="watchlist.csv",
+                mime="text/csv"
+            )
+    
     # Clear watchlist
     if current_watchlist and st.sidebar.button("Clear Watchlist"):
-        save_watchlist(supabase, st.session_state.user_id, [])
+        clear_watchlist(supabase, st.session_state.user_id)
         st.rerun()
 
 # Popular stocks
@@ -331,26 +253,22 @@ if ticker_input and st.session_state.api_key:
     progress_bar = st.progress(0)
     status_text = st.empty()
     
-    # Process each ticker one by one
-    for i, ticker in enumerate(tickers):
-        # Update progress
-        progress = (i + 1) / len(tickers)
-        progress_bar.progress(progress)
-        status_text.markdown(f"<div class='processing-status'>🔄 Processing {ticker} ({i+1}/{len(tickers)})</div>", unsafe_allow_html=True)
-        
-        # Fetch stock data
-        stock_data = get_stock_info(ticker)
-        
-        # Store result
+    # Fetch all tickers concurrently and display each one as it completes
+    def on_result(stock_data):
         st.session_state.processed_stocks.append(stock_data)
+        done = len(st.session_state.processed_stocks)
         
-        # Display individual result
-        if stock_data:
-            display_stock_info(stock_data)
+        # Update progress
+        progress_bar.progress(done / len(tickers))
+        status_text.markdown(f"<div class='processing-status'>🔄 Received {stock_data.symbol} ({done}/{len(tickers)})</div>", unsafe_allow_html=True)
         
-        # Add delay between requests to respect API limits (only if not cached)
-        if i < len(tickers) - 1:  # Don't delay after the last request
-            time.sleep(12)  # 12-second delay between stocks to stay within rate limits
+        # Display individual result
+        if stock_data.cached:
+            display_cache_badge(stock_data)
+        display_stock_info(stock_data)
+    
+    status_text.markdown(f"<div class='processing-status'>🔄 Processing {', '.join(tickers)}</div>", unsafe_allow_html=True)
+    fetch_stocks(tickers, st.session_state.api_key, supabase, on_result)
     
     # Clear progress indicators
     progress_bar.empty()
@@ -359,22 +277,16 @@ if ticker_input and st.session_state.api_key:
     # Create and display summary table
     if st.session_state.processed_stocks:
         st.markdown("## 📋 Summary List")
-        summary_df = create_summary_table(st.session_state.processed_stocks)
+        summary_df = build_summary(st.session_state.processed_stocks)
         
         if summary_df is not None:
-            st.dataframe(summary_df, use_container_width=True)
+            st.dataframe(summary_df, column_config=summary_column_config(), hide_index=True, use_container_width=True)
             
-            # Add download button for CSV
-            csv = summary_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Download Summary as CSV",
-                data=csv,
-                file_name=f"stock_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+            # Exports are built only on request
+            export_controls(summary_df, "summary")
             
             # Show statistics
-            successful_count = len([s for s in st.session_state.processed_stocks if s.get('status') == 'success'])
+            successful_count = len([s for s in st.session_state.processed_stocks if s.ok])
             failed_count = len(st.session_state.processed_stocks) - successful_count
             
             col1, col2, col3 = st.columns(3)
@@ -390,4 +302,4 @@ if ticker_input and st.session_state.api_key:
 
 # Add footer
 st.markdown("---")
-st.markdown("Data provided by Alpha Vantage API | Database: Supabase") 
\ No newline at end of file
+st.markdown(f"Data provided by Alpha Vantage API | Database: {storage_backend_name(supabase) if supabase else 'None'}") 
\ No newline at end of file
@@ -1,32 +1,39 @@
 import streamlit as st
-import requests
-from datetime import datetime
-import time
-from database import init_supabase, cache_stock_data, get_cached_stock_data, save_watchlist, get_watchlist, get_popular_stocks
+from database import init_storage, storage_backend_name, get_database_status, get_cache_write_status, get_session_watchlist, add_to_watchlist, remove_from_watchlist, clear_watchlist, import_watchlist, export_watchlist, get_popular_stocks
+from stock_fetcher import lookup_cached, estimate_api_calls, bulk_quotes_available
+from refresher import start_refresh_worker
+from summary import build_summary, summary_column_config, SUMMARY_COLUMNS
+from export import export_controls
+from rate_limiter import get_rate_limiter, CALLS_PER_MINUTE, CALLS_PER_DAY
+from result_store import result_store
+from settings import server_api_key
+from fetch_jobs import start_fetch_job, QUEUED, RATE_LIMITED, CANCELLED, FAILED
+import streamlit.components.v1 as components
 import uuid
+import math
 
 st.set_page_config(page_title="Stock Price Tracker", page_icon="📈", layout="wide")
 
+# Above this many symbols, results are shown as one paginated grid instead of a card per symbol
+COMPACT_VIEW_THRESHOLD = 20
+COMPACT_PAGE_SIZE = 50
+
+# How often the progress fragment polls a running fetch job
+FETCH_POLL_SECONDS = 1
+
 # Initialize session state first (before any other code that uses it)
 if 'api_key' not in st.session_state:
-    # Don't try to get API key from secrets if it's a placeholder
-    try:
-        secret_key = st.secrets.get("ALPHA_VANTAGE_API_KEY", "")
-        if secret_key and secret_key != "your_api_key_here":
-            st.session_state.api_key = secret_key
-        else:
-            st.session_state.api_key = None
-    except:
-        st.session_state.api_key = None
+    # The server's key from secrets or the environment, unless it is the placeholder
+    st.session_state.api_key = server_api_key()
 
 if 'user_id' not in st.session_state:
     st.session_state.user_id = str(uuid.uuid4())
 
 if 'processed_stocks' not in st.session_state:
-    st.session_state.processed_stocks = []
+    # A reloaded page picks its last results back up from the shared store
+    result_set_id = st.query_params.get("results")
+    st.session_state.processed_stocks = (result_store.load_result_set(result_set_id) if result_set_id else None) or []
 
-if 'download_counter' not in st.session_state:
-    st.session_state.download_counter = 0
 
 # Add custom CSS
 st.markdown("""
@@ -55,23 +62,6 @@ st.markdown("""
         border-left: 5px solid #ffc107;
         margin: 15px 0;
     }
-    .countdown-timer {
-        background-color: #f8d7da;
-        padding: 20px;
-        border-radius: 10px;
-        border-left: 5px solid #dc3545;
-        margin: 20px 0;
-        text-align: center;
-        font-size: 1.2em;
-        font-weight: bold;
-    }
-    .batch-info {
-        background-color: #d1ecf1;
-        padding: 10px;
-        border-radius: 5px;
-        border-left: 5px solid #17a2b8;
-        margin: 10px 0;
-    }
     .summary-table {
         margin-top: 30px;
     }
@@ -111,133 +101,44 @@ if not st.session_state.api_key:
     st.info("💡 **Tip**: Registration takes less than 1 minute and gives you instant access to real-time stock data!")
 
 # Initialize database connection
-supabase = init_supabase()
-
-def get_stock_info(ticker_symbol):
-    if not st.session_state.api_key:
-        return {'symbol': ticker_symbol, 'status': 'error', 'error': 'API key not configured'}
-    
-    # Try to get cached data first
-    cached_data = get_cached_stock_data(supabase, ticker_symbol)
-    if cached_data:
-        st.info(f"📊 Using cached data for {ticker_symbol} (updated within last 15 minutes)")
-        return cached_data
-        
-    try:
-        # Get Global Quote
-        quote_url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-        quote_response = requests.get(quote_url)
-        quote_data = quote_response.json()
-        
-        # Check for API errors first
-        if "Error Message" in quote_data:
-            return {'symbol': ticker_symbol, 'status': 'error', 'error': quote_data['Error Message']}
-        
-        if "Note" in quote_data:
-            return {'symbol': ticker_symbol, 'status': 'rate_limit', 'error': f"Rate limit: {quote_data['Note']}"}
-            
-        if "Information" in quote_data:
-            return {'symbol': ticker_symbol, 'status': 'rate_limit', 'error': f"API Info: {quote_data['Information']}"}
-        
-        if "Global Quote" in quote_data and quote_data["Global Quote"]:
-            global_quote = quote_data["Global Quote"]
-            
-            # Check if price data exists
-            price_key = "05. price"
-            if price_key not in global_quote:
-                return {'symbol': ticker_symbol, 'status': 'error', 'error': 'Price data not available'}
-            
-            current_price = float(global_quote[price_key])
-            
-            # Get Company Overview for the name
-            overview_url = f"https://www.alphavantage.co/query?function=OVERVIEW&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-            overview_response = requests.get(overview_url)
-            overview_data = overview_response.json()
-            
-            if "Error Message" in overview_data:
-                company_name = ticker_symbol
-            else:
-                company_name = overview_data.get("Name", ticker_symbol)
-            
-            # Get Weekly Adjusted Time Series for 52-week high/low
-            weekly_url = f"https://www.alphavantage.co/query?function=TIME_SERIES_WEEKLY_ADJUSTED&symbol={ticker_symbol}&apikey={st.session_state.api_key}"
-            weekly_response = requests.get(weekly_url)
-            weekly_data = weekly_response.json()
-            
-            if "Error Message" in weekly_data:
-                return {'symbol': ticker_symbol, 'status': 'error', 'error': weekly_data['Error Message']}
-            
-            if "Note" in weekly_data:
-                return {'symbol': ticker_symbol, 'status': 'rate_limit', 'error': f"Rate limit: {weekly_data['Note']}"}
-                
-            if "Information" in weekly_data:
-                return {'symbol': ticker_symbol, 'status': 'rate_limit', 'error': f"API Info: {weekly_data['Information']}"}
-            
-            if "Weekly Adjusted Time Series" in weekly_data:
-                time_series = weekly_data["Weekly Adjusted Time Series"]
-                
-                # Get data from the last 52 weeks
-                highs = []
-                lows = []
-                count = 0
-                for date in sorted(time_series.keys(), reverse=True):
-                    if count < 52:  # Only look at last 52 weeks
-                        lows.append(float(time_series[date]["3. low"]))
-                        highs.append(float(time_series[date]["2. high"]))
-                        count += 1
-                    else:
-                        break
-                
-                fifty_two_week_low = min(lows) if lows else None
-                fifty_two_week_high = max(highs) if highs else None
-                
-                if fifty_two_week_low and fifty_two_week_high:
-                    stock_data = {
-                        'symbol': ticker_symbol,
-                        'current_price': current_price,
-                        '52_week_low': fifty_two_week_low,
-                        '52_week_high': fifty_two_week_high,
-                        'company_name': company_name,
-                        'status': 'success'
-                    }
-                    
-                    # Cache the data
-                    cache_stock_data(supabase, ticker_symbol, stock_data)
-                    
-                    return stock_data
-                else:
-                    return {'symbol': ticker_symbol, 'status': 'error', 'error': 'Could not calculate 52-week range'}
-            else:
-                return {'symbol': ticker_symbol, 'status': 'error', 'error': 'No historical data available'}
-        else:
-            return {'symbol': ticker_symbol, 'status': 'error', 'error': 'No quote data available'}
-        
-    except Exception as e:
-        return {'symbol': ticker_symbol, 'status': 'error', 'error': str(e)}
+supabase = init_storage()
+
+# Keep watchlist and popular symbols warm in the background, using the server's API key only
+refresh_worker = None
+if server_api_key():
+    refresh_worker = start_refresh_worker(supabase, server_api_key())
+
+def display_cache_badge(stock_data):
+    """Show how old cached data is, flagging stale rows that are being refreshed"""
+    age_minutes = int(stock_data.age_minutes)
+    if stock_data.stale:
+        st.warning(f"🕒 Showing {stock_data.symbol} data from {age_minutes} minutes ago while fresh data loads in the background")
+    else:
+        st.info(f"📊 Using cached data for {stock_data.symbol} (updated {age_minutes} minutes ago)")
 
 def display_stock_info(stock_data):
-    if stock_data and stock_data.get('status') == 'success':
+    if stock_data and stock_data.ok:
         # Display company name in a header
-        st.subheader(f"📊 {stock_data['company_name']} ({stock_data['symbol']})")
+        st.subheader(f"📊 {stock_data.company_name} ({stock_data.symbol})")
         
         # First row: Current Price
-        st.metric("Current Price", f"${stock_data['current_price']:.2f}")
+        st.metric("Current Price", f"${stock_data.current_price:.2f}")
         
         # Second row: 52 Week Range
         col1, col2 = st.columns(2)
         
         with col1:
-            st.metric("52 Week Low", f"${stock_data['52_week_low']:.2f}")
+            st.metric("52 Week Low", f"${stock_data.week_52_low:.2f}")
         with col2:
-            st.metric("52 Week High", f"${stock_data['52_week_high']:.2f}")
+            st.metric("52 Week High", f"${stock_data.week_52_high:.2f}")
         
         # Third row: Performance Metrics
         col1, col2 = st.columns(2)
         
         with col1:
             # Calculate how far above 52-week low
-            diff_low = stock_data['current_price'] - stock_data['52_week_low']
-            diff_low_percent = (diff_low / stock_data['52_week_low']) * 100
+            diff_low = stock_data.current_price - stock_data.week_52_low
+            diff_low_percent = (diff_low / stock_data.week_52_low) * 100
             st.metric(
                 "Above 52W Low", 
                 f"{diff_low_percent:.1f}%",
@@ -246,8 +147,8 @@ def display_stock_info(stock_data):
         
         with col2:
             # Calculate how far below 52-week high
-            diff_high = stock_data['current_price'] - stock_data['52_week_high']
-            diff_high_percent = (diff_high / stock_data['52_week_high']) * 100
+            diff_high = stock_data.current_price - stock_data.week_52_high
+            diff_high_percent = (diff_high / stock_data.week_52_high) * 100
             st.metric(
                 "Below 52W High", 
                 f"{abs(diff_high_percent):.1f}%",
@@ -258,233 +159,200 @@ def display_stock_info(stock_data):
         # Add analysis section
         st.markdown("### 📈 Price Analysis")
         st.markdown(f"""
-        - Current price is **${stock_data['current_price']:.2f}**
-        - **{diff_low_percent:.1f}%** above 52-week low of ${stock_data['52_week_low']:.2f}
-        - **{abs(diff_high_percent):.1f}%** below 52-week high of ${stock_data['52_week_high']:.2f}
+        - Current price is **${stock_data.current_price:.2f}**
+        - **{diff_low_percent:.1f}%** above 52-week low of ${stock_data.week_52_low:.2f}
+        - **{abs(diff_high_percent):.1f}%** below 52-week high of ${stock_data.week_52_high:.2f}
         """)
         
         # Add divider
         st.markdown("<div class='stock-divider'></div>", unsafe_allow_html=True)
     else:
-        if stock_data.get('status') == 'rate_limit':
-            st.error(f"🛑 Rate limit reached for {stock_data['symbol']}: {stock_data.get('error', 'Rate limit exceeded')}")
+        if stock_data.status == 'rate_limit':
+            st.error(f"🛑 Rate limit reached for {stock_data.symbol}: {stock_data.error or 'Rate limit exceeded'}")
         else:
-            st.error(f"❌ Failed to fetch data for {stock_data['symbol']}: {stock_data.get('error', 'Unknown error')}")
-
-def create_summary_list(processed_stocks):
-    """Create a summary list of all processed stocks"""
-    if not processed_stocks:
-        return []
+            st.error(f"❌ Failed to fetch data for {stock_data.symbol}: {stock_data.error or 'Unknown error'}")
+
+def display_compact_results(summary_df):
+    """One sorted, paginated grid; per-symbol details are rendered only for the selected symbol"""
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", SUMMARY_COLUMNS, key="compact_sort")
+    with col2:
+        descending = st.checkbox("Descending", key="compact_descending")
+    pages = max(1, math.ceil(len(summary_df) / COMPACT_PAGE_SIZE))
+    if st.session_state.get("compact_page", 1) > pages:
+        st.session_state.compact_page = 1  # Fewer results than last time
+    with col3:
+        page = st.number_input("Page", min_value=1, max_value=pages, key="compact_page")
     
-    summary_data = []
-    for stock in processed_stocks:
-        if stock.get('status') == 'success':
-            diff_low_percent = ((stock['current_price'] - stock['52_week_low']) / stock['52_week_low']) * 100
-            diff_high_percent = ((stock['current_price'] - stock['52_week_high']) / stock['52_week_high']) * 100
-            
-            summary_data.append({
-                'Symbol': stock['symbol'],
-                'Company': stock['company_name'],
-                'Current Price': f"${stock['current_price']:.2f}",
-                '52W Low': f"${stock['52_week_low']:.2f}",
-                '52W High': f"${stock['52_week_high']:.2f}",
-                'Above Low %': f"{diff_low_percent:.1f}%",
-                'Below High %': f"{abs(diff_high_percent):.1f}%",
-                'Status': '✅ Success'
-            })
-        else:
-            status_icon = "🛑" if stock.get('status') == 'rate_limit' else "❌"
-            summary_data.append({
-                'Symbol': stock['symbol'],
-                'Company': 'N/A',
-                'Current Price': 'N/A',
-                '52W Low': 'N/A',
-                '52W High': 'N/A',
-                'Above Low %': 'N/A',
-                'Below High %': 'N/A',
-                'Status': f"{status_icon} {stock.get('error', 'Error')}"
-            })
+    # Sort the whole result set, then send only the current page to the browser
+    ordered = summary_df.sort_values(sort_by, ascending=not descending, na_position="last", kind="stable")
+    page_df = ordered.iloc[(page - 1) * COMPACT_PAGE_SIZE:page * COMPACT_PAGE_SIZE]
+    st.dataframe(page_df, column_config=summary_column_config(), hide_index=True, use_container_width=True)
+    st.caption(f"Page {page} of {pages} · {len(summary_df)} symbols")
     
-    return summary_data
-
-def display_summary_table(summary_data):
-    """Display summary data as a simple table"""
-    if not summary_data:
+    detail_symbol = st.selectbox("Show details for:", ["(none)"] + page_df["Symbol"].tolist(), key="compact_detail")
+    if detail_symbol != "(none)":
+        stock_data = next(stock for stock in st.session_state.processed_stocks if stock.symbol == detail_symbol)
+        display_stock_info(stock_data)
+
+def display_summary_table(summary_df):
+    """Display the summary as a sortable table, formatting numbers only for display"""
+    if summary_df is None or summary_df.empty:
         return
     
     # Create header
     st.markdown("### 📋 Summary Results")
+    if len(summary_df) > COMPACT_VIEW_THRESHOLD:
+        display_compact_results(summary_df)
+    else:
+        st.dataframe(summary_df, column_config=summary_column_config(), hide_index=True, use_container_width=True)
     
-    # Display as a simple table using markdown
-    headers = ['Symbol', 'Company', 'Current Price', '52W Low', '52W High', 'Above Low %', 'Below High %', 'Status']
-    
-    # Create markdown table
-    table_md = "| " + " | ".join(headers) + " |\n"
-    table_md += "| " + " | ".join(["---"] * len(headers)) + " |\n"
-    
-    for row in summary_data:
-        table_md += "| " + " | ".join([str(row[header]) for header in headers]) + " |\n"
-    
-    st.markdown(table_md)
-    
-    # Create CSV content for download
-    csv_content = ",".join(headers) + "\n"
-    for row in summary_data:
-        csv_content += ",".join([f'"{str(row[header])}"' for header in headers]) + "\n"
-    
-    # Increment download counter for unique key
-    st.session_state.download_counter += 1
+    # Exports are built only on request
+    export_controls(summary_df, "summary")
+
+def start_fetch(tickers):
+    """Serve cached stocks at once and fetch the misses on the background job pool.
+    A run already in progress for this session is cancelled first."""
+    running = st.session_state.get('fetch_job')
+    if running and not running.done:
+        running.cancel()
     
-    st.download_button(
-        label="📥 Download Summary as CSV",
-        data=csv_content,
-        file_name=f"stock_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-        mime="text/csv",
-        key=f"download_csv_{st.session_state.download_counter}"
-    )
-
-def countdown_timer(seconds, message):
-    """Display a countdown timer"""
-    countdown_placeholder = st.empty()
+    limiter = get_rate_limiter(st.session_state.api_key)
+    _, calls_left_today = limiter.status()
     
-    for remaining in range(seconds, 0, -1):
-        mins, secs = divmod(remaining, 60)
-        countdown_placeholder.markdown(f"""
-        <div class='countdown-timer'>
-            ⏳ {message}<br/>
-            <span style='font-size: 2em; color: #dc3545;'>{mins:02d}:{secs:02d}</span><br/>
-            <small>Waiting for API rate limit reset...</small>
-        </div>
-        """, unsafe_allow_html=True)
-        time.sleep(1)
-    
-    countdown_placeholder.empty()
-
-def process_stocks_with_rate_limiting(tickers):
-    """Process stocks in batches respecting API rate limits"""
-    BATCH_SIZE = 5
-    WAIT_TIME = 60  # 1 minute between batches
+    # Resolve every cached symbol in one query; only misses go to the API
+    cached_stocks, uncached_tickers = lookup_cached(tickers, st.session_state.api_key, supabase)
+    api_calls = estimate_api_calls(uncached_tickers, st.session_state.api_key)
+    st.session_state.fetch_plan = {
+        "cached": len(cached_stocks),
+        "api_calls": api_calls,
+        "calls_left_today": calls_left_today,
+        "estimated_seconds": int(limiter.estimate_wait(api_calls))
+    }
     
     # Clear previous results
     st.session_state.processed_stocks = []
+    st.query_params.pop("results", None)
+    st.session_state.fetch_job = start_fetch_job(tickers, cached_stocks, uncached_tickers, st.session_state.api_key, supabase)
+
+def display_fetch_plan(job, plan):
+    """What the running job will cost, as planned when it started"""
+    total = len(job.symbols)
+    estimated_time = plan["estimated_seconds"]
+    quote_mode = "bulk (up to 100 symbols per call)" if bulk_quotes_available(st.session_state.api_key) else "one call per symbol"
+    
+    st.markdown(f"""
+    ### 📊 Processing Plan
+    - **Total Symbols**: {total}
+    - **Cached**: {plan["cached"]} (shown immediately, no API calls)
+    - **To Fetch**: {len(job.uncached)}
+    - **API Calls**: up to {plan["api_calls"]}
+    - **Quotes**: {quote_mode}
+    - **Estimated Time**: up to ~{estimated_time // 60} minutes {estimated_time % 60} seconds
+    """)
     
     # Check daily limit warning
-    if len(tickers) > 25:
+    if plan["api_calls"] > plan["calls_left_today"]:
         st.warning(f"""
         ⚠️ **Daily Limit Warning**
         
-        You're requesting {len(tickers)} symbols, but Alpha Vantage free tier only allows **25 requests per day**.
+        Fetching {len(job.uncached)} uncached symbols takes up to {plan["api_calls"]} API calls, but only **{plan["calls_left_today"]}** of today's {CALLS_PER_DAY} free tier requests are left.
         
         **Recommendation**: 
-        - Process only your most important 25 stocks today
+        - Process only your most important stocks today
         - Consider upgrading to a paid plan for higher limits
         - Or spread your requests across multiple days
         """)
     
-    # Split tickers into batches
-    batches = [tickers[i:i + BATCH_SIZE] for i in range(0, len(tickers), BATCH_SIZE)]
+    if estimated_time > 0:
+        display_countdown(job.started_at + estimated_time)
+
+def display_countdown(deadline):
+    """Time left until `deadline` (epoch seconds), counted down in the browser without reruns"""
+    components.html(f"""
+    <div id="countdown" style="font-family: sans-serif; color: #555;"></div>
+    <script>
+    const deadline = {deadline * 1000:.0f};
+    const el = document.getElementById("countdown");
+    function tick() {{
+        const left = Math.max(0, Math.round((deadline - Date.now()) / 1000));
+        el.textContent = left > 0
+            ? `⏳ Up to ${{Math.floor(left / 60)}}m ${{left % 60}}s remaining`
+            : "⏳ Finishing up...";
+        if (left > 0) setTimeout(tick, 1000);
+    }}
+    tick();
+    </script>
+    """, height=30)
+
+@st.fragment(run_every=FETCH_POLL_SECONDS)
+def display_fetch_progress():
+    """Show results as they land. Only this fragment reruns while the job is in progress;
+    the full page reruns once when it is done."""
+    job = st.session_state.get('fetch_job')
+    if job is None:
+        return
     
-    # Display batch information
-    if len(batches) > 1:
-        st.markdown(f"""
-        <div class='rate-limit-warning'>
-            ⚠️ <strong>Rate Limit Management</strong><br/>
-            Processing {len(tickers)} symbols in {len(batches)} batch(es) of {BATCH_SIZE} stocks each.<br/>
-            There will be a 1-minute wait between batches to respect Alpha Vantage's 5 calls/minute limit.<br/>
-            <strong>Daily limit: {len(tickers)} of 25 requests will be used today.</strong>
-        </div>
-        """, unsafe_allow_html=True)
+    if job.done:
+        # Hand the results to the page and keep the run in the shared store for reloads
+        st.session_state.processed_stocks = job.results()
+        st.session_state.last_fetch = job
+        st.session_state.fetch_job = None
+        st.query_params["results"] = job.result_set_id
+        st.rerun()
     
-    total_processed = 0
+    results = job.results()
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.progress(min(1.0, len(results) / len(job.symbols)))
+        latest = f"Received {results[-1].symbol} " if results else ""
+        status = "Waiting for a fetch worker" if job.status == QUEUED else "Processing"
+        st.markdown(f"<div class='processing-status'>🔄 {status} {len(job.symbols)} symbols · {latest}({len(results)}/{len(job.symbols)})</div>", unsafe_allow_html=True)
+    with col2:
+        if st.button("⏹️ Cancel", key="cancel_fetch", use_container_width=True):
+            job.cancel()
     
-    for batch_num, batch_tickers in enumerate(batches, 1):
-        # Display batch info
-        st.markdown(f"""
-        <div class='batch-info'>
-            📦 <strong>Processing Batch {batch_num} of {len(batches)}</strong><br/>
-            Symbols: {', '.join(batch_tickers)}
-        </div>
-        """, unsafe_allow_html=True)
+    # Display individual results (large runs only show the grid at the end)
+    if len(job.symbols) <= COMPACT_VIEW_THRESHOLD:
+        for stock_data in results:
+            if stock_data.cached:
+                display_cache_badge(stock_data)
+            display_stock_info(stock_data)
+
+def display_fetch_outcome(job):
+    """How the last run ended"""
+    total_processed = len(st.session_state.processed_stocks) - (1 if job.rate_limited else 0)
+    
+    # Check for rate limit error and report what was processed
+    if job.status == RATE_LIMITED:
+        stock_data = job.rate_limited
+        st.error(f"""
+        🛑 **Processing Stopped - API Rate Limit Reached**
         
-        # Create progress tracking for this batch
-        batch_progress = st.progress(0)
-        batch_status = st.empty()
+        **Error on symbol**: {stock_data.symbol}
+        **Error message**: {stock_data.error or 'Rate limit exceeded'}
         
-        # Process each stock in the current batch
-        for i, ticker in enumerate(batch_tickers):
-            # Update progress
-            progress = (i + 1) / len(batch_tickers)
-            batch_progress.progress(progress)
-            batch_status.markdown(f"<div class='processing-status'>🔄 Processing {ticker} ({i+1}/{len(batch_tickers)} in batch {batch_num})</div>", unsafe_allow_html=True)
-            
-            # Fetch stock data
-            stock_data = get_stock_info(ticker)
-            
-            # Check for rate limit error and stop processing immediately
-            if stock_data and stock_data.get('status') == 'rate_limit':
-                st.session_state.processed_stocks.append(stock_data)
-                batch_progress.empty()
-                batch_status.empty()
-                
-                st.error(f"""
-                🛑 **Processing Stopped - API Rate Limit Reached**
-                
-                **Error on symbol**: {ticker}
-                **Error message**: {stock_data.get('error', 'Rate limit exceeded')}
-                
-                **What happened**: Alpha Vantage API rate limit has been exceeded.
-                
-                **Next steps**:
-                1. Wait for the rate limit to reset (usually 1 minute)
-                2. Try again with fewer symbols
-                3. Consider upgrading to a paid Alpha Vantage plan for higher limits
-                
-                **Processed so far**: {total_processed} out of {len(tickers)} symbols
-                """)
-                
-                # Display summary of what was processed so far
-                if st.session_state.processed_stocks:
-                    st.markdown("### 📊 Partial Results (Before Rate Limit)")
-                    summary_data = create_summary_list(st.session_state.processed_stocks)
-                    if summary_data:
-                        display_summary_table(summary_data)
-                
-                return  # Stop all processing immediately
-            
-            # Store result
-            st.session_state.processed_stocks.append(stock_data)
-            total_processed += 1
-            
-            # Display individual result
-            if stock_data:
-                display_stock_info(stock_data)
-            
-            # Add delay between requests within batch (12 seconds to be safe)
-            if i < len(batch_tickers) - 1:
-                time.sleep(12)
+        **What happened**: Alpha Vantage API rate limit has been exceeded.
         
-        # Clear batch progress
-        batch_progress.empty()
-        batch_status.markdown(f"<div class='processing-status'>✅ Batch {batch_num} Complete! ({len(batch_tickers)} stocks processed)</div>", unsafe_allow_html=True)
+        **Next steps**:
+        1. Wait for the rate limit to reset
+        2. Try again with fewer symbols
+        3. Consider upgrading to a paid Alpha Vantage plan for higher limits
         
-        # Wait between batches (except for the last batch)
-        if batch_num < len(batches):
-            st.markdown(f"""
-            <div class='rate-limit-warning'>
-                🕐 <strong>Rate Limit Break</strong><br/>
-                Completed batch {batch_num} of {len(batches)}. Waiting 1 minute before processing next batch...
-            </div>
-            """, unsafe_allow_html=True)
-            
-            countdown_timer(WAIT_TIME, f"Next batch ({batch_num + 1}/{len(batches)}) starts in:")
-    
-    # Final completion message
-    st.markdown(f"""
-    <div class='processing-status'>
-        🎉 <strong>All Processing Complete!</strong><br/>
-        Successfully processed {total_processed} stocks across {len(batches)} batch(es).
-    </div>
-    """, unsafe_allow_html=True)
+        **Processed so far**: {total_processed} out of {len(job.symbols)} symbols
+        """)
+    elif job.status == CANCELLED:
+        st.warning(f"⏹️ Processing cancelled after {total_processed} out of {len(job.symbols)} symbols.")
+    elif job.status == FAILED:
+        st.error(f"Error while fetching stocks: {job.error}")
+    else:
+        st.markdown(f"""
+        <div class='processing-status'>
+            🎉 <strong>All Processing Complete!</strong><br/>
+            Successfully processed {total_processed} stocks.
+        </div>
+        """, unsafe_allow_html=True)
 
 # Sidebar
 st.sidebar.title("🔧 Configuration")
@@ -516,7 +384,15 @@ else:
 
 # Database status
 if supabase:
-    st.sidebar.success("Database connected! ✅")
+    st.sidebar.success(f"Database connected ({storage_backend_name(supabase)})! ✅")
+    if refresh_worker:
+        st.sidebar.caption(f"🔄 Background refresh on · {refresh_worker.refreshed_count} symbols refreshed")
+    db_status = get_database_status(supabase)
+    if db_status and db_status["state"] != "closed":
+        st.sidebar.warning(f"Database unavailable, using in-memory data ({db_status['state']}): {db_status['last_error']}")
+    write_status = get_cache_write_status(supabase)
+    if write_status and write_status["last_error"]:
+        st.sidebar.warning(f"Cache writes failing ({write_status['pending']} pending, will retry): {write_status['last_error']}")
 else:
     st.sidebar.warning("Database not connected (optional)")
 
@@ -528,22 +404,30 @@ st.sidebar.info("""
 - 25 calls per day
 
 **Smart Processing:**
-- Batches of 5 stocks
-- 1-minute wait between batches
-- 12-second delay between stocks
+- Shared rate limit across all sessions
+- Calls go out as soon as quota is free
+- Cached symbols use no quota
 - **Auto-stops on rate limit errors**
 """)
+if st.session_state.api_key:
+    calls_now, calls_today = get_rate_limiter(st.session_state.api_key).status()
+    st.sidebar.caption(f"Calls available now: {calls_now}/{CALLS_PER_MINUTE} · today: {calls_today}/{CALLS_PER_DAY}")
 
 # Processing controls
 st.sidebar.title("⚙️ Processing Controls")
 if st.sidebar.button("Clear Results"):
+    if st.session_state.get('fetch_job'):
+        st.session_state.fetch_job.cancel()
+        st.session_state.fetch_job = None
     st.session_state.processed_stocks = []
+    st.session_state.last_fetch = None
+    st.query_params.pop("results", None)
     st.rerun()
 
 # Watchlist management
 st.sidebar.title("📝 Watchlist")
 if supabase:
-    current_watchlist = get_watchlist(supabase, st.session_state.user_id)
+    current_watchlist = get_session_watchlist(supabase, st.session_state.user_id)
     
     if current_watchlist:
         st.sidebar.subheader("Your Watchlist:")
@@ -558,14 +442,36 @@ if supabase:
     new_symbol = st.sidebar.text_input("Add symbol to watchlist:").upper()
     if st.sidebar.button("Add to Watchlist") and new_symbol:
         if new_symbol not in current_watchlist:
-            current_watchlist.append(new_symbol)
-            if save_watchlist(supabase, st.session_state.user_id, current_watchlist):
+            if add_to_watchlist(supabase, st.session_state.user_id, new_symbol):
                 st.sidebar.success(f"Added {new_symbol}!")
                 st.rerun()
     
+    # Remove from watchlist
+    if current_watchlist:
+        remove_symbol = st.sidebar.selectbox("Remove symbol from watchlist:", current_watchlist)
+        if st.sidebar.button("Remove from Watchlist"):
+            if remove_from_watchlist(supabase, st.session_state.user_id, remove_symbol):
+                st.rerun()
+    
+    # Bulk import/export
+    with st.sidebar.expander("Import / Export"):
+        import_text = st.text_area("Symbols to import (comma or newline separated):")
+        replace_watchlist = st.checkbox("Replace current watchlist")
+        if st.button("Import") and import_text:
+            symbols = import_text.replace("\n", ",").split(",")
+            if import_watchlist(supabase, st.session_state.user_id, symbols, replace=replace_watchlist) is not None:
+                st.rerun()
+        if current_watchlist:
+            st.download_button(
+                label="📥 Export Watchlist (CSV)",
+                data=export_watchlist(current_watchlist),
+                file_name="watchlist.csv",
+                mime="text/csv"
+            )
+    
     # Clear watchlist
     if current_watchlist and st.sidebar.button("Clear Watchlist"):
-        save_watchlist(supabase, st.session_state.user_id, [])
+        clear_watchlist(supabase, st.session_state.user_id)
         st.rerun()
 
 # Popular stocks
@@ -618,47 +524,13 @@ AAPL, MSFT, GOOGL, AMZN, META
 💡 **Tip**: With 25 daily requests, focus on your most important stocks!
 """)
 
-# Only process when the fetch button is clicked
+# Only start a run when the fetch button is clicked; a new run replaces one in progress
 if fetch_button and ticker_input and st.session_state.api_key:
     # Split and clean the input
     tickers = [t.strip() for t in ticker_input.split(',') if t.strip()]
     
     if len(tickers) > 0:
-        # Display processing plan
-        batch_count = (len(tickers) + 4) // 5  # Ceiling division
-        estimated_time = (batch_count - 1) * 60 + len(tickers) * 12  # Wait time + processing time
-        
-        st.markdown(f"""
-        ### 📊 Processing Plan
-        - **Total Symbols**: {len(tickers)}
-        - **Batches**: {batch_count} (max 5 symbols per batch)
-        - **Estimated Time**: ~{estimated_time // 60} minutes {estimated_time % 60} seconds
-        """)
-        
-        # Process stocks with intelligent rate limiting
-        process_stocks_with_rate_limiting(tickers)
-        
-        # Create and display summary table
-        if st.session_state.processed_stocks:
-            summary_data = create_summary_list(st.session_state.processed_stocks)
-            
-            if summary_data:
-                display_summary_table(summary_data)
-                
-                # Show statistics
-                successful_count = len([s for s in st.session_state.processed_stocks if s.get('status') == 'success'])
-                failed_count = len(st.session_state.processed_stocks) - successful_count
-                
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Total Processed", len(st.session_state.processed_stocks))
-                with col2:
-                    st.metric("Successful", successful_count)
-                with col3:
-                    st.metric("Failed", failed_count)
-        
-        # Add note about data freshness
-        st.info("Note: Data is refreshed every minute during market hours. Cached data is used when available to reduce API calls.")
+        start_fetch(tickers)
 
 elif fetch_button and not st.session_state.api_key:
     st.error("⚠️ Please enter your Alpha Vantage API key in the sidebar before fetching data.")
@@ -666,16 +538,25 @@ elif fetch_button and not st.session_state.api_key:
 elif fetch_button and not ticker_input:
     st.warning("⚠️ Please enter at least one stock symbol before fetching data.")
 
-# Display previous results if they exist (without the fetch button being clicked)
-elif st.session_state.processed_stocks and not fetch_button:
-    st.markdown("### 📋 Previous Results")
-    summary_data = create_summary_list(st.session_state.processed_stocks)
+# A run in progress streams its results; the rest of the page stays responsive
+if st.session_state.get('fetch_job'):
+    display_fetch_plan(st.session_state.fetch_job, st.session_state.fetch_plan)
+    display_fetch_progress()
+
+# Display results of the last run, or ones restored from the shared store
+elif st.session_state.processed_stocks or st.session_state.get('last_fetch'):
+    last_fetch = st.session_state.get('last_fetch')
+    if last_fetch:
+        display_fetch_outcome(last_fetch)
+    else:
+        st.markdown("### 📋 Previous Results")
+    summary_df = build_summary(st.session_state.processed_stocks)
     
-    if summary_data:
-        display_summary_table(summary_data)
+    if summary_df is not None:
+        display_summary_table(summary_df)
         
         # Show statistics
-        successful_count = len([s for s in st.session_state.processed_stocks if s.get('status') == 'success'])
+        successful_count = len([s for s in st.session_state.processed_stocks if s.ok])
         failed_count = len(st.session_state.processed_stocks) - successful_count
         
         col1, col2, col3 = st.columns(3)
@@ -686,8 +567,9 @@ elif st.session_state.processed_stocks and not fetch_button:
         with col3:
             st.metric("Failed", failed_count)
     
-    st.info("💡 Click 'Fetch Data' button to update with current symbols or get fresh data.")
+    # Add note about data freshness
+    st.info("Note: Data is refreshed every minute during market hours. Cached data is used when available to reduce API calls.")
 
 # Add footer
 st.markdown("---")
-st.markdown("Data provided by Alpha Vantage API | Database: Supabase") 
\ No newline at end of file
+st.markdown(f"Data provided by Alpha Vantage API | Database: {storage_backend_name(supabase) if supabase else 'None'}") 
\ No newline at end of file
@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency that is known to be failing"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} unavailable, retrying in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+class CallTimeout(Exception):
+    """A call took longer than its latency budget"""
+
+class CircuitBreaker:
+    """Fail fast on a dependency after repeated failures or slow calls.
+
+    Calls run in a small worker pool and are abandoned once they exceed
+    their latency budget, which counts as a failure. After
+    `failure_threshold` consecutive failures the circuit opens and calls
+    raise CircuitOpen at once. After `reset_timeout` seconds one probe
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0, max_workers=8):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.last_error = None
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-call")
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            retry_in = self._opened_at + self.reset_timeout - time.monotonic()
+            if retry_in > 0 or self._probing:
+                raise CircuitOpen(self.name, max(retry_in, 0))
+            self._probing = True
+            return True
+
+    def _record(self, probe, error=None):
+        with self._lock:
+            if probe:
+                self._probing = False
+            if error is None:
+                self.failures = 0
+                self._state = CLOSED
+                return
+            self.failures += 1
+            self.last_error = str(error)
+            if probe or self.failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def call(self, fn, timeout, inline=False):
+        """Run `fn()` and return its result, giving up after `timeout` seconds.
+
+        With `inline`, `fn` runs on the calling thread and must enforce its
+        own timeout; a call slower than `timeout` still counts as a failure.
+        Calls also run inline once the worker pool has been shut down, which
+        concurrent.futures does at interpreter exit before atexit handlers run.
+        """
+        probe = self._before_call()
+        if not inline:
+            try:
+                future = self._pool.submit(fn)
+            except RuntimeError:
+                inline = True
+        if inline:
+            return self._call_inline(fn, timeout, probe)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            error = CallTimeout(f"{self.name} call exceeded {timeout:g}s")
+            self._record(probe, error)
+            raise error
+        except Exception as e:
+            self._record(probe, e)
+            raise
+        self._record(probe)
+        return result
+
+    def _call_inline(self, fn, timeout, probe):
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            self._record(probe, e)
+            raise
+        elapsed = time.monotonic() - started
+        self._record(probe, CallTimeout(f"{self.name} call took {elapsed:.1f}s, over {timeout:g}s") if elapsed > timeout else None)
+        return result
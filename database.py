@@ -1,105 +1,441 @@
 import streamlit as st
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
+from dataclasses import replace
 from datetime import datetime, timedelta
-import json
+import os
+import threading
+from local_cache import LRUCache, MISSING
+from write_behind import WriteBehindBuffer
+from popularity import PopularityTracker
+from storage_sqlite import SQLiteClient
+from settings import get_setting
+from circuit_breaker import CircuitBreaker, CircuitOpen, OPEN
+from stock_quote import StockQuote, CACHE_TTL_MINUTES
+from result_store import result_store
+
+# In-process cache tier shared by all sessions; Supabase is only read on a local miss
+LOCAL_CACHE_TTL_SECONDS = 60
+LOCAL_CACHE_MAX_ENTRIES = 2048
+_local_cache = LRUCache(max_entries=LOCAL_CACHE_MAX_ENTRIES, ttl=LOCAL_CACHE_TTL_SECONDS)
 
 # Initialize Supabase client
 @st.cache_resource
 def init_supabase():
+    supabase_url = get_setting("SUPABASE_URL")
+    supabase_key = get_setting("SUPABASE_ANON_KEY")
+    if not (supabase_url and supabase_key):
+        return None
     try:
-        supabase_url = st.secrets["SUPABASE_URL"]
-        supabase_key = st.secrets["SUPABASE_ANON_KEY"]
-        supabase: Client = create_client(supabase_url, supabase_key)
+        supabase: Client = create_client(supabase_url, supabase_key, options=ClientOptions(postgrest_client_timeout=DB_TIMEOUTS["batch"]))
         return supabase
     except:
         return None
 
-# Cache stock data to reduce API calls
-def cache_stock_data(supabase, symbol, stock_data):
+# Initialize the configured storage backend. STORAGE_BACKEND (secrets or environment) is
+# "supabase", "sqlite", or "auto" (default): Supabase when configured, otherwise SQLite.
+# Every function below accepts either client.
+@st.cache_resource
+def init_storage():
+    backend = get_setting("STORAGE_BACKEND", "auto").lower()
+    
+    if backend in ("supabase", "auto"):
+        supabase = init_supabase()
+        if supabase or backend == "supabase":
+            return supabase
+    
+    try:
+        return SQLiteClient()
+    except Exception as e:
+        st.error(f"Error opening local database: {e}")
+        return None
+
+# Display name of the storage backend behind a client
+def storage_backend_name(supabase):
+    return getattr(supabase, "backend_name", "Supabase")
+
+# Seconds each kind of database call may take before it is abandoned and counted as a failure
+DB_TIMEOUTS = {
+    "read": 1.5,
+    "write": 3.0,
+    "batch": 10.0,  # Background batch writes, off the request path
+}
+
+# Circuit breakers, one per Supabase client. While a breaker is open, calls fail in
+# microseconds and reads fall back to whatever the local tier still holds.
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def _breaker(supabase):
+    with _breakers_lock:
+        if id(supabase) not in _breakers:
+            _breakers[id(supabase)] = CircuitBreaker(storage_backend_name(supabase))
+        return _breakers[id(supabase)]
+
+# Execute a query through the client's circuit breaker, within the latency budget for its kind.
+# Batch writes run on background threads and in atexit flushes, so they run inline and rely
+# on the client's own timeout (set to the batch budget) rather than the breaker's worker pool.
+def _db_call(supabase, kind, query):
+    return _breaker(supabase).call(query.execute, DB_TIMEOUTS[kind], inline=kind == "batch")
+
+# Show a database error, except fast failures while the circuit is open (the sidebar reports those)
+def _report_db_error(message, e):
+    if not isinstance(e, CircuitOpen):
+        st.error(f"{message}: {e}")
+
+# Circuit state for the UI: "closed" (healthy), "open" (failing fast) or "half-open" (probing)
+def get_database_status(supabase):
+    if not supabase:
+        return None
+    breaker = _breaker(supabase)
+    return {"state": breaker.state, "failures": breaker.failures, "last_error": breaker.last_error}
+
+# Whether database calls are currently being attempted
+def database_available(supabase):
+    return bool(supabase) and _breaker(supabase).state != OPEN
+
+# Write-behind buffers for stock_cache, one per Supabase client
+_stock_cache_writers = {}
+_stock_cache_writers_lock = threading.Lock()
+
+def _stock_cache_writer(supabase):
+    with _stock_cache_writers_lock:
+        if id(supabase) not in _stock_cache_writers:
+            def write_rows(rows):
+                _db_call(supabase, "batch", supabase.table("stock_cache").upsert(rows, on_conflict="symbol"))
+            _stock_cache_writers[id(supabase)] = WriteBehindBuffer(write_rows, name="stock-cache-writer")
+        return _stock_cache_writers[id(supabase)]
+
+# Status of queued stock_cache writes, for showing failed flushes in the UI
+def get_cache_write_status(supabase):
+    if not supabase:
+        return None
+    writer = _stock_cache_writer(supabase)
+    return {
+        "pending": writer.pending_count(),
+        "flushed": writer.flushed_rows,
+        "failed_flushes": writer.failed_flushes,
+        "last_error": writer.last_error
+    }
+
+# Cache stock data to reduce API calls. The row is queued and written to Supabase in
+# batches off the request path; the local tier serves it in the meantime.
+def cache_stock_data(supabase, symbol, quote):
+    if not supabase:
+        return
+    
+    try:
+        # Keep the local tier in step with our own write; it holds records, not rows
+        _local_cache.set(("stock", symbol), result_store.intern(replace(quote, cached=True)))
+        
+        # Queue the insert or update of stock data
+        _stock_cache_writer(supabase).add(symbol, quote.to_row())
+    except Exception as e:
+        _report_db_error("Error caching data", e)
+
+# The cached record if it is no older than allowed, otherwise None
+def _fresh_quote(quote, max_age_minutes, max_stale_minutes):
+    if quote is None or quote.age_minutes > max_age_minutes + max_stale_minutes:
+        return None
+    return quote
+
+# Get cached stock data (if recent, or up to max_stale_minutes past that when stale rows are allowed)
+def get_cached_stock_data(supabase, symbol, max_age_minutes=CACHE_TTL_MINUTES, max_stale_minutes=0):
+    if not supabase:
+        return None
+    
+    try:
+        quote = _local_cache.get(("stock", symbol))
+        if quote is MISSING:
+            result = _db_call(supabase, "read", supabase.table("stock_cache").select("*").eq("symbol", symbol))
+            quote = result_store.intern(StockQuote.from_row(result.data[0])) if result.data else None
+            _local_cache.set(("stock", symbol), quote)
+        
+        return _fresh_quote(quote, max_age_minutes, max_stale_minutes)
+    except Exception as e:
+        _report_db_error("Error retrieving cached data", e)
+        # Serve an expired local copy while the database is unavailable
+        quote = _local_cache.get(("stock", symbol), allow_expired=True)
+        return None if quote is MISSING else _fresh_quote(quote, max_age_minutes, max_stale_minutes)
+
+# Get cached stock data for many symbols in one query; returns {symbol: quote} for the hits only
+def get_cached_stock_data_bulk(supabase, symbols, max_age_minutes=CACHE_TTL_MINUTES, max_stale_minutes=0):
+    if not supabase or not symbols:
+        return {}
+    
+    quotes = {}
+    to_query = []
+    for symbol in set(symbols):
+        quote = _local_cache.get(("stock", symbol))
+        if quote is MISSING:
+            to_query.append(symbol)
+        else:
+            quotes[symbol] = quote
+    
+    try:
+        if to_query:
+            result = _db_call(supabase, "read", supabase.table("stock_cache").select("*").in_("symbol", to_query))
+            found = {item['symbol']: result_store.intern(StockQuote.from_row(item)) for item in result.data}
+            for symbol in to_query:
+                quotes[symbol] = found.get(symbol)
+                _local_cache.set(("stock", symbol), quotes[symbol])
+    except Exception as e:
+        _report_db_error("Error retrieving cached data", e)
+        # Serve expired local copies while the database is unavailable
+        for symbol in to_query:
+            quote = _local_cache.get(("stock", symbol), allow_expired=True)
+            if quote is not MISSING:
+                quotes[symbol] = quote
+    
+    cached = {}
+    for symbol, quote in quotes.items():
+        quote = _fresh_quote(quote, max_age_minutes, max_stale_minutes)
+        if quote:
+            cached[symbol] = quote
+    return cached
+
+# Cache company metadata (name, exchange, sector), which changes far less often than prices
+def cache_company_metadata(supabase, symbol, metadata):
     if not supabase:
         return
     
     try:
         data = {
             "symbol": symbol,
-            "current_price": stock_data['current_price'],
-            "week_52_low": stock_data['52_week_low'],
-            "week_52_high": stock_data['52_week_high'],
-            "company_name": stock_data['company_name'],
+            "company_name": metadata['company_name'],
+            "exchange": metadata.get('exchange'),
+            "sector": metadata.get('sector'),
             "updated_at": datetime.now().isoformat()
         }
         
-        # Insert or update stock data
-        result = supabase.table("stock_cache").upsert(data, on_conflict="symbol").execute()
+        result = _db_call(supabase, "write", supabase.table("company_metadata").upsert(data, on_conflict="symbol"))
+        _local_cache.set(("metadata", symbol), data)
         return result
     except Exception as e:
-        st.error(f"Error caching data: {e}")
+        _report_db_error("Error caching company metadata", e)
 
-# Get cached stock data (if recent)
-def get_cached_stock_data(supabase, symbol, max_age_minutes=15):
+# Get cached company metadata (if not too old)
+def get_cached_company_metadata(supabase, symbol, max_age_days=30):
     if not supabase:
         return None
     
     try:
-        # Get data updated within the last 15 minutes
-        cutoff_time = (datetime.now() - timedelta(minutes=max_age_minutes)).isoformat()
-        
-        result = supabase.table("stock_cache").select("*").eq("symbol", symbol).gte("updated_at", cutoff_time).execute()
+        data = _local_cache.get(("metadata", symbol))
+        if data is MISSING:
+            try:
+                result = _db_call(supabase, "read", supabase.table("company_metadata").select("*").eq("symbol", symbol))
+                data = result.data[0] if result.data else None
+                _local_cache.set(("metadata", symbol), data)
+            except Exception:
+                # Use an expired local copy while the database is unavailable
+                data = _local_cache.get(("metadata", symbol), allow_expired=True)
+                if data is MISSING:
+                    raise
         
-        if result.data:
-            data = result.data[0]
+        if data and datetime.fromisoformat(data['updated_at']) >= datetime.now() - timedelta(days=max_age_days):
             return {
                 'symbol': data['symbol'],
-                'current_price': data['current_price'],
-                '52_week_low': data['week_52_low'],
-                '52_week_high': data['week_52_high'],
-                'company_name': data['company_name']
+                'company_name': data['company_name'],
+                'exchange': data['exchange'],
+                'sector': data['sector']
             }
         return None
     except Exception as e:
-        st.error(f"Error retrieving cached data: {e}")
+        _report_db_error("Error retrieving company metadata", e)
         return None
 
-# Save user watchlist
-def save_watchlist(supabase, user_id, watchlist):
+# Get when each of the given symbols was last cached
+def get_cache_updated_times(supabase, symbols):
+    if not supabase or not symbols:
+        return {}
+    
+    try:
+        result = _db_call(supabase, "read", supabase.table("stock_cache").select("symbol, updated_at").in_("symbol", list(symbols)))
+        return {item["symbol"]: datetime.fromisoformat(item["updated_at"]) for item in result.data}
+    except Exception as e:
+        _report_db_error("Error retrieving cache times", e)
+        return {}
+
+# Watchlists are stored one row per (user, symbol) in watchlist_items, ordered by position.
+# Each Streamlit session keeps its own copy, read once and dropped on every write.
+def _session_watchlist_key(user_id):
+    return f"_watchlist_{user_id}"
+
+def _invalidate_session_watchlist(user_id):
+    st.session_state.pop(_session_watchlist_key(user_id), None)
+
+def _parse_symbols(symbols):
+    """Upper-cased, de-duplicated symbols in their original order"""
+    seen = []
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if symbol and symbol not in seen:
+            seen.append(symbol)
+    return seen
+
+# Next free position at the end of a user's watchlist
+def _next_watchlist_position(supabase, user_id):
+    result = _db_call(supabase, "read", supabase.table("watchlist_items").select("position").eq("user_id", user_id).order("position", desc=True).limit(1))
+    return result.data[0]["position"] + 1 if result.data else 0
+
+# Add one symbol to the end of a user's watchlist (no-op if it is already there)
+def add_to_watchlist(supabase, user_id, symbol):
     if not supabase:
         return False
     
     try:
         data = {
             "user_id": user_id,
-            "watchlist": json.dumps(watchlist),
-            "updated_at": datetime.now().isoformat()
+            "symbol": symbol.strip().upper(),
+            "position": _next_watchlist_position(supabase, user_id),
+            "added_at": datetime.now().isoformat()
         }
-        
-        result = supabase.table("user_watchlists").upsert(data, on_conflict="user_id").execute()
+        _db_call(supabase, "write", supabase.table("watchlist_items").upsert(data, on_conflict="user_id,symbol", ignore_duplicates=True))
+        _invalidate_session_watchlist(user_id)
         return True
     except Exception as e:
-        st.error(f"Error saving watchlist: {e}")
+        _report_db_error("Error saving watchlist", e)
         return False
 
-# Get user watchlist
-def get_watchlist(supabase, user_id):
+# Remove one symbol from a user's watchlist
+def remove_from_watchlist(supabase, user_id, symbol):
     if not supabase:
-        return []
+        return False
+    
+    try:
+        _db_call(supabase, "write", supabase.table("watchlist_items").delete().eq("user_id", user_id).eq("symbol", symbol))
+        _invalidate_session_watchlist(user_id)
+        return True
+    except Exception as e:
+        _report_db_error("Error saving watchlist", e)
+        return False
+
+# Remove every symbol from a user's watchlist
+def clear_watchlist(supabase, user_id):
+    if not supabase:
+        return False
+    
+    try:
+        _db_call(supabase, "write", supabase.table("watchlist_items").delete().eq("user_id", user_id))
+        _invalidate_session_watchlist(user_id)
+        return True
+    except Exception as e:
+        _report_db_error("Error saving watchlist", e)
+        return False
+
+# Add many symbols in one write, after the existing ones (or in place of them with replace=True).
+# Returns the number of symbols imported, or None on error.
+def import_watchlist(supabase, user_id, symbols, replace=False):
+    if not supabase:
+        return None
     
     try:
-        result = supabase.table("user_watchlists").select("watchlist").eq("user_id", user_id).execute()
+        symbols = _parse_symbols(symbols)
+        if replace:
+            _db_call(supabase, "write", supabase.table("watchlist_items").delete().eq("user_id", user_id))
+            existing, position = [], 0
+        else:
+            existing = get_watchlist(supabase, user_id)
+            position = _next_watchlist_position(supabase, user_id)
         
-        if result.data:
-            return json.loads(result.data[0]['watchlist'])
+        now = datetime.now().isoformat()
+        rows = []
+        for symbol in symbols:
+            if symbol not in existing:
+                rows.append({"user_id": user_id, "symbol": symbol, "position": position, "added_at": now})
+                position += 1
+        if rows:
+            _db_call(supabase, "write", supabase.table("watchlist_items").upsert(rows, on_conflict="user_id,symbol", ignore_duplicates=True))
+        _invalidate_session_watchlist(user_id)
+        return len(rows)
+    except Exception as e:
+        _report_db_error("Error importing watchlist", e)
+        return None
+
+def _read_watchlist(supabase, user_id):
+    result = _db_call(supabase, "read", supabase.table("watchlist_items").select("symbol").eq("user_id", user_id).order("position"))
+    return [item["symbol"] for item in result.data]
+
+# Get user watchlist from the database, in watchlist order
+def get_watchlist(supabase, user_id):
+    if not supabase:
         return []
+    
+    try:
+        return _read_watchlist(supabase, user_id)
     except Exception as e:
-        st.error(f"Error retrieving watchlist: {e}")
+        _report_db_error("Error retrieving watchlist", e)
+        return []
+
+# Get user watchlist for the current session, reading the database only after a write.
+# A failed read is not kept, so the next rerun tries again.
+def get_session_watchlist(supabase, user_id):
+    if not supabase:
         return []
+    
+    key = _session_watchlist_key(user_id)
+    if key not in st.session_state:
+        try:
+            st.session_state[key] = _read_watchlist(supabase, user_id)
+        except Exception as e:
+            _report_db_error("Error retrieving watchlist", e)
+            return []
+    
+    # Callers may modify the list they get back
+    return list(st.session_state[key])
 
-# Get popular stocks (most queried)
+# Watchlist as CSV text (symbol,position) for download
+def export_watchlist(watchlist):
+    return "symbol,position\n" + "".join(f"{symbol},{position}\n" for position, symbol in enumerate(watchlist))
+
+# View counters, one per Supabase client. Views are counted in memory and flushed as
+# aggregated increments through the increment_stock_views function.
+POPULARITY_SEED_LIMIT = 500
+_popularity_trackers = {}
+_popularity_trackers_lock = threading.Lock()
+
+def _popularity_tracker(supabase):
+    with _popularity_trackers_lock:
+        if id(supabase) not in _popularity_trackers:
+            def write_increments(rows):
+                _db_call(supabase, "batch", supabase.rpc("increment_stock_views", {"views": rows}))
+            tracker = PopularityTracker(write_increments)
+            
+            # Start from the stored totals so a restart keeps the ranking
+            try:
+                result = _db_call(supabase, "read", supabase.table("stock_views").select("symbol, company_name, view_count, last_viewed_at").order("view_count", desc=True).limit(POPULARITY_SEED_LIMIT))
+                tracker.seed(result.data)
+            except Exception as e:
+                tracker.last_error = str(e)
+            _popularity_trackers[id(supabase)] = tracker
+        return _popularity_trackers[id(supabase)]
+
+# Count one view of a symbol (no database write until the next flush)
+def record_stock_view(supabase, symbol, company_name=None):
+    if not supabase:
+        return
+    _popularity_tracker(supabase).record_view(symbol, company_name)
+
+# Get popular stocks (most viewed recently), served from memory
 def get_popular_stocks(supabase, limit=10):
     if not supabase:
         return []
     
     try:
-        result = supabase.table("stock_cache").select("symbol, company_name").order("updated_at", desc=True).limit(limit).execute()
-        return [{"symbol": item["symbol"], "name": item["company_name"]} for item in result.data]
+        return _popularity_tracker(supabase).top(limit)
+    except Exception as e:
+        return []
+
+# Get every symbol in any user's watchlist, with the number of watchlists it appears in
+def get_watchlist_symbol_counts(supabase):
+    if not supabase:
+        return {}
+    
+    try:
+        result = _db_call(supabase, "read", supabase.table("watchlist_items").select("symbol"))
+        counts = {}
+        for item in result.data:
+            counts[item["symbol"]] = counts.get(item["symbol"], 0) + 1
+        return counts
     except Exception as e:
-        return [] 
\ No newline at end of file
+        return {}
@@ -12,7 +12,45 @@ CREATE TABLE IF NOT EXISTS stock_cache (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Table to store user watchlists
+-- Table to cache company metadata (kept much longer than prices)
+CREATE TABLE IF NOT EXISTS company_metadata (
+    id SERIAL PRIMARY KEY,
+    symbol VARCHAR(10) UNIQUE NOT NULL,
+    company_name VARCHAR(200),
+    exchange VARCHAR(50),
+    sector VARCHAR(100),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Table to count how often each stock is viewed (written as batched increments)
+CREATE TABLE IF NOT EXISTS stock_views (
+    symbol VARCHAR(10) PRIMARY KEY,
+    company_name VARCHAR(200),
+    view_count BIGINT NOT NULL DEFAULT 0,
+    last_viewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Add a batch of view counts: views is a JSON array of {symbol, company_name, views, last_viewed_at}
+CREATE OR REPLACE FUNCTION increment_stock_views(views JSONB) RETURNS void AS $$
+    INSERT INTO stock_views (symbol, company_name, view_count, last_viewed_at)
+    SELECT v->>'symbol', v->>'company_name', (v->>'views')::BIGINT, (v->>'last_viewed_at')::TIMESTAMP
+    FROM jsonb_array_elements(views) AS v
+    ON CONFLICT (symbol) DO UPDATE SET
+        view_count = stock_views.view_count + EXCLUDED.view_count,
+        company_name = COALESCE(EXCLUDED.company_name, stock_views.company_name),
+        last_viewed_at = GREATEST(stock_views.last_viewed_at, EXCLUDED.last_viewed_at);
+$$ LANGUAGE sql;
+
+-- Table to store user watchlists, one row per (user, symbol) in watchlist order
+CREATE TABLE IF NOT EXISTS watchlist_items (
+    user_id UUID NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
+    position INTEGER NOT NULL,
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, symbol)
+);
+
+-- Earlier versions stored each watchlist as one JSON blob; kept only to migrate from
 CREATE TABLE IF NOT EXISTS user_watchlists (
     id SERIAL PRIMARY KEY,
     user_id UUID UNIQUE NOT NULL,
@@ -23,15 +61,35 @@ CREATE TABLE IF NOT EXISTS user_watchlists (
 -- Index for faster queries
 CREATE INDEX IF NOT EXISTS idx_stock_cache_symbol ON stock_cache(symbol);
 CREATE INDEX IF NOT EXISTS idx_stock_cache_updated_at ON stock_cache(updated_at);
+CREATE INDEX IF NOT EXISTS idx_company_metadata_symbol ON company_metadata(symbol);
 CREATE INDEX IF NOT EXISTS idx_user_watchlists_user_id ON user_watchlists(user_id);
+CREATE INDEX IF NOT EXISTS idx_watchlist_items_user_position ON watchlist_items(user_id, position);
+CREATE INDEX IF NOT EXISTS idx_stock_views_view_count ON stock_views(view_count DESC);
 
 -- Enable Row Level Security (optional but recommended)
 ALTER TABLE stock_cache ENABLE ROW LEVEL SECURITY;
+ALTER TABLE company_metadata ENABLE ROW LEVEL SECURITY;
+ALTER TABLE stock_views ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_watchlists ENABLE ROW LEVEL SECURITY;
+ALTER TABLE watchlist_items ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to stock_cache
 CREATE POLICY "Allow public read access" ON stock_cache FOR SELECT USING (true);
 CREATE POLICY "Allow public insert/update" ON stock_cache FOR ALL USING (true);
 
+-- Allow public access to company_metadata
+CREATE POLICY "Allow public access to metadata" ON company_metadata FOR ALL USING (true);
+
+-- Allow public access to view counts
+CREATE POLICY "Allow public access to view counts" ON stock_views FOR ALL USING (true);
+
 -- Allow users to manage their own watchlists
-CREATE POLICY "Users can manage own watchlists" ON user_watchlists FOR ALL USING (true); 
\ No newline at end of file
+CREATE POLICY "Users can manage own watchlists" ON user_watchlists FOR ALL USING (true);
+CREATE POLICY "Users can manage own watchlist items" ON watchlist_items FOR ALL USING (true);
+
+-- One-time migration of existing watchlists into watchlist_items
+INSERT INTO watchlist_items (user_id, symbol, position)
+SELECT w.user_id, item.symbol, item.position - 1
+FROM user_watchlists w, jsonb_array_elements_text(w.watchlist::jsonb) WITH ORDINALITY AS item(symbol, position)
+ON CONFLICT (user_id, symbol) DO NOTHING;
+DELETE FROM user_watchlists; 
\ No newline at end of file
@@ -0,0 +1,85 @@
+import csv
+import io
+import math
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from summary import SUMMARY_COLUMNS, PRICE_COLUMNS, PERCENT_COLUMNS
+
+# Label -> (file extension, MIME type). Parquet and Arrow keep the numeric columns typed.
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+CSV_CHUNK_ROWS = 1000
+
+def _csv_value(value, digits):
+    return "" if value is None or (isinstance(value, float) and math.isnan(value)) else round(value, digits)
+
+def iter_csv(summary_df, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield the summary as CSV text in chunks of `chunk_rows` rows, written by csv.writer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(SUMMARY_COLUMNS)
+    digits = [2 if column in PRICE_COLUMNS else 1 if column in PERCENT_COLUMNS else None for column in SUMMARY_COLUMNS]
+    for count, row in enumerate(summary_df[SUMMARY_COLUMNS].itertuples(index=False, name=None), start=1):
+        writer.writerow([value if places is None else _csv_value(value, places) for value, places in zip(row, digits)])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_summary(summary_df, export_format):
+    """The summary encoded as `export_format` (a key of EXPORT_FORMATS), as bytes"""
+    output = io.BytesIO()
+    if export_format == "CSV":
+        text = io.TextIOWrapper(output, encoding="utf-8", newline="")
+        for chunk in iter_csv(summary_df):
+            text.write(chunk)
+        text.flush()
+        text.detach()
+    elif export_format == "Parquet":
+        summary_df.to_parquet(output, index=False)
+    elif export_format == "Arrow":
+        summary_df.reset_index(drop=True).to_feather(output)
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return output.getvalue()
+
+def _summary_signature(summary_df):
+    """Cheap fingerprint of the summary data, to tell when a prepared export is out of date.
+    Status is left out: its "Cached N min ago" text changes every minute without new data."""
+    data_columns = [column for column in summary_df.columns if column != 'Status']
+    return int(pd.util.hash_pandas_object(summary_df[data_columns], index=False).sum())
+
+def export_controls(summary_df, key):
+    """Format picker and download button. The file is only built when "Prepare" is clicked,
+    and kept in the session until the results or the format change."""
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        export_format = st.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format", label_visibility="collapsed")
+
+    prepared = st.session_state.get("summary_export")
+    signature = _summary_signature(summary_df)
+    if not prepared or prepared["signature"] != signature or prepared["format"] != export_format:
+        with col2:
+            if not st.button(f"📦 Prepare {export_format} Export", key=f"{key}_prepare"):
+                return
+        try:
+            prepared = {"signature": signature, "format": export_format, "data": export_summary(summary_df, export_format)}
+        except Exception as e:
+            st.error(f"Error creating {export_format} export: {e}")
+            return
+        st.session_state.summary_export = prepared
+
+    extension, mime = EXPORT_FORMATS[export_format]
+    with col2:
+        st.download_button(
+            label=f"📥 Download Summary as {export_format}",
+            data=prepared["data"],
+            file_name=f"stock_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+            mime=mime,
+            key=f"{key}_download"
+        )
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from stock_fetcher import fetch_stocks, plan_quote_batches
+from result_store import result_store
+
+# Fetch runs waiting on the rate limiter hold one of these threads, never a session's script thread
+FETCH_JOB_WORKERS = int(os.environ.get("FETCH_JOB_WORKERS", "8"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+RATE_LIMITED = "rate_limited"
+FAILED = "failed"
+
+_job_pool = ThreadPoolExecutor(max_workers=FETCH_JOB_WORKERS, thread_name_prefix="fetch-job")
+
+class FetchJob:
+    """One session's fetch run, executed on the shared job pool.
+
+    Cached results are known up front; the rest arrive on the pool thread
+    and can be read with results() while the run is in progress. The run
+    stops at the first rate limit error or when cancel() is called.
+    """
+
+    def __init__(self, symbols, cached, uncached, api_key, supabase):
+        self.symbols = symbols
+        self.uncached = uncached
+        self.api_key = api_key
+        self.supabase = supabase
+        self.status = QUEUED
+        self.error = None
+        self.rate_limited = None  # The result that stopped the run
+        self.result_set_id = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._results = list(cached)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._future = None
+
+    def start(self):
+        self._future = _job_pool.submit(self._run)
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def done(self):
+        return self.status not in (QUEUED, RUNNING)
+
+    def results(self):
+        """Results so far, in arrival order"""
+        with self._lock:
+            return list(self._results)
+
+    def _on_result(self, stock_data):
+        with self._lock:
+            self._results.append(stock_data)
+        if stock_data.status == 'rate_limit':
+            self.rate_limited = stock_data
+            return False
+        return not self._cancel.is_set()
+
+    def _run(self):
+        self.status = RUNNING
+        try:
+            # One bulk quote call per batch when the API key supports it
+            for batch in plan_quote_batches(self.uncached, self.api_key):
+                if self._cancel.is_set() or self.rate_limited:
+                    break
+                fetch_stocks(batch, self.api_key, self.supabase, self._on_result, cancel=self._cancel)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.result_set_id = result_store.save_result_set(self.results())
+            self.finished_at = time.time()
+            if self.error:
+                self.status = FAILED
+            elif self.rate_limited:
+                self.status = RATE_LIMITED
+            elif self._cancel.is_set():
+                self.status = CANCELLED
+            else:
+                self.status = DONE
+
+def start_fetch_job(symbols, cached, uncached, api_key, supabase):
+    """Start fetching `uncached` in the background and return the FetchJob"""
+    return FetchJob(symbols, cached, uncached, api_key, supabase).start()
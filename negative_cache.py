@@ -0,0 +1,45 @@
+import time
+from local_cache import LRUCache, MISSING
+from stock_quote import StockQuote
+
+# "Invalid API call" error from Alpha Vantage: the symbol is not valid
+INVALID = "invalid"
+# Empty "Global Quote": often a bad symbol, but can be a temporary gap in the data
+TRANSIENT = "transient"
+
+TTL_SECONDS = {
+    INVALID: 24 * 60 * 60,
+    TRANSIENT: 15 * 60,
+}
+
+def is_invalid_symbol_error(message):
+    """Whether an Alpha Vantage "Error Message" means the symbol is unknown.
+
+    The same field also reports a missing or invalid API key, which says
+    nothing about the symbol and must not be cached for everyone.
+    """
+    return message.startswith("Invalid API call")
+
+class NegativeCache:
+    """Process-wide record of failed symbol lookups, so repeats are rejected without an API call"""
+
+    def __init__(self, max_entries=4096):
+        self._entries = LRUCache(max_entries=max_entries)
+
+    def record(self, symbol, kind, error):
+        ttl = TTL_SECONDS[kind]
+        self._entries.set(symbol, (kind, error, time.monotonic() + ttl), ttl=ttl)
+
+    def lookup(self, symbol):
+        """Cached failure for `symbol` as an error result, or None"""
+        entry = self._entries.get(symbol)
+        if entry is MISSING:
+            return None
+        kind, error, expires_at = entry
+        retry_minutes = max(1, int((expires_at - time.monotonic()) / 60))
+        return StockQuote.failure(symbol, f"{error} (recent failure, not retried for {retry_minutes} min)", failure_kind=kind)
+
+    def clear(self, symbol):
+        self._entries.invalidate(symbol)
+
+negative_cache = NegativeCache()
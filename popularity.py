@@ -0,0 +1,129 @@
+import atexit
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+
+HALF_LIFE_HOURS = 24  # A view counts half as much after this long
+FLUSH_INTERVAL_SECONDS = 30
+MAX_TRACKED_SYMBOLS = 5000
+
+# Scores grow as exp(t / tau) instead of decaying every entry; rebase before they overflow
+_REBASE_EXPONENT = 500
+
+class PopularityTracker:
+    """Time-decayed view counts per symbol, kept in memory and flushed as aggregated increments.
+
+    Each view adds exp((now - epoch) / tau) to the symbol's score, which
+    ranks symbols exactly like views decaying with a half-life, without
+    touching the other entries. `top(k)` selects from the scores with a
+    heap. View counts since the last flush are written every
+    `flush_interval` seconds through `write_increments`, and once more
+    at interpreter exit; a failed write keeps them for the next flush.
+    """
+
+    def __init__(self, write_increments, half_life_hours=HALF_LIFE_HOURS, flush_interval=FLUSH_INTERVAL_SECONDS,
+                 max_symbols=MAX_TRACKED_SYMBOLS, name="popularity-flusher"):
+        self.write_increments = write_increments
+        self.tau = half_life_hours * 3600 / math.log(2)
+        self.flush_interval = flush_interval
+        self.max_symbols = max_symbols
+        self.flushed_views = 0
+        self.last_error = None
+        self._epoch = time.time()
+        self._scores = {}
+        self._names = {}
+        self._pending = {}  # symbol -> [views, last_viewed_at]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _weight(self, at):
+        exponent = (at - self._epoch) / self.tau
+        if exponent > _REBASE_EXPONENT:
+            factor = math.exp(-exponent)
+            self._scores = {symbol: score * factor for symbol, score in self._scores.items()}
+            self._epoch = at
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def _add_score(self, symbol, views, at):
+        self._scores[symbol] = self._scores.get(symbol, 0.0) + views * self._weight(at)
+        if len(self._scores) > self.max_symbols:
+            keep = heapq.nlargest(self.max_symbols // 2, self._scores.items(), key=lambda item: item[1])
+            self._scores = dict(keep)
+            self._names = {symbol: self._names[symbol] for symbol in self._scores if symbol in self._names}
+
+    def seed(self, rows):
+        """Load stored totals (symbol, company_name, view_count, last_viewed_at) after a restart"""
+        with self._lock:
+            for row in rows:
+                last_viewed = row.get("last_viewed_at")
+                at = datetime.fromisoformat(last_viewed).timestamp() if last_viewed else self._epoch
+                self._add_score(row["symbol"], row["view_count"], min(at, time.time()))
+                if row.get("company_name"):
+                    self._names.setdefault(row["symbol"], row["company_name"])
+
+    def record_view(self, symbol, company_name=None):
+        now = time.time()
+        with self._lock:
+            self._add_score(symbol, 1, now)
+            if company_name:
+                self._names[symbol] = company_name
+            pending = self._pending.setdefault(symbol, [0, now])
+            pending[0] += 1
+            pending[1] = now
+
+    def top(self, k):
+        """The `k` most viewed symbols as [{"symbol", "name"}], most popular first"""
+        with self._lock:
+            ranked = heapq.nlargest(k, self._scores.items(), key=lambda item: item[1])
+            return [{"symbol": symbol, "name": self._names.get(symbol, symbol)} for symbol, _ in ranked]
+
+    def pending_count(self):
+        with self._lock:
+            return sum(views for views, _ in self._pending.values())
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        self._stop.set()
+
+    def flush(self):
+        """Write the view counts gathered since the last flush; return False if the write failed"""
+        with self._flush_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+                names = dict(self._names)
+            if not pending:
+                return True
+
+            rows = [
+                {
+                    "symbol": symbol,
+                    "company_name": names.get(symbol),
+                    "views": views,
+                    "last_viewed_at": datetime.fromtimestamp(last_viewed).isoformat()
+                }
+                for symbol, (views, last_viewed) in pending.items()
+            ]
+            try:
+                self.write_increments(rows)
+                self.flushed_views += sum(row["views"] for row in rows)
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                with self._lock:
+                    for symbol, (views, last_viewed) in pending.items():
+                        current = self._pending.setdefault(symbol, [0, last_viewed])
+                        current[0] += views
+                        current[1] = max(current[1], last_viewed)
+                return False
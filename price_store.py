@@ -0,0 +1,117 @@
+import os
+import threading
+import numpy as np
+
+PRICE_STORE_DIR = os.environ.get("PRICE_STORE_DIR", os.path.join(".cache", "prices"))
+FREQUENCIES = ("weekly", "daily")
+
+# One file per column; dates are stored as YYYYMMDD integers
+COLUMNS = {
+    "date": np.dtype("<i4"),
+    "open": np.dtype("<f4"),
+    "high": np.dtype("<f4"),
+    "low": np.dtype("<f4"),
+    "close": np.dtype("<f4"),
+}
+
+def date_to_int(day):
+    """'2024-06-14' -> 20240614"""
+    return int(day.replace("-", ""))
+
+def int_to_date(value):
+    """20240614 -> '2024-06-14'"""
+    value = int(value)
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+class ColumnarPriceStore:
+    """Append-only OHLC history per symbol, stored as typed column files and read via memory-mapping.
+
+    Reads return NumPy arrays backed by the files, so years of bars for
+    many symbols can be queried without loading them into memory.
+    """
+
+    def __init__(self, directory=PRICE_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, symbol, frequency, column):
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Unknown frequency: {frequency}")
+        return os.path.join(self.directory, frequency, symbol, f"{column}.bin")
+
+    def _length(self, symbol, frequency):
+        """Rows present in every column (a torn append leaves some columns longer)"""
+        lengths = []
+        for column, dtype in COLUMNS.items():
+            try:
+                lengths.append(os.path.getsize(self._path(symbol, frequency, column)) // dtype.itemsize)
+            except OSError:
+                return 0
+        return min(lengths)
+
+    def length(self, symbol, frequency="weekly"):
+        with self._lock:
+            return self._length(symbol, frequency)
+
+    def _map(self, symbol, frequency, length):
+        if length == 0:
+            return {column: np.empty(0, dtype) for column, dtype in COLUMNS.items()}
+        return {
+            column: np.memmap(self._path(symbol, frequency, column), dtype=dtype, mode="r", shape=(length,))
+            for column, dtype in COLUMNS.items()
+        }
+
+    def read(self, symbol, frequency="weekly", start=None, end=None):
+        """Bars with start <= date <= end (ISO dates, both optional) as a dict of column arrays"""
+        with self._lock:
+            columns = self._map(symbol, frequency, self._length(symbol, frequency))
+        dates = columns["date"]
+        lo = np.searchsorted(dates, date_to_int(start), side="left") if start else 0
+        hi = np.searchsorted(dates, date_to_int(end), side="right") if end else len(dates)
+        return {column: values[lo:hi] for column, values in columns.items()}
+
+    def tail(self, symbol, count, frequency="weekly"):
+        """The most recent `count` bars as a dict of column arrays"""
+        with self._lock:
+            columns = self._map(symbol, frequency, self._length(symbol, frequency))
+        return {column: values[-count:] for column, values in columns.items()}
+
+    def _truncate(self, symbol, frequency, length):
+        for column, dtype in COLUMNS.items():
+            path = self._path(symbol, frequency, column)
+            if os.path.exists(path) and os.path.getsize(path) != length * dtype.itemsize:
+                os.truncate(path, length * dtype.itemsize)
+
+    def append(self, symbol, bars, frequency="weekly"):
+        """Append (date, open, high, low, close) bars, oldest first, after the stored ones"""
+        bars = list(bars)
+        if not bars:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path(symbol, frequency, "date")), exist_ok=True)
+            self._truncate(symbol, frequency, self._length(symbol, frequency))
+            values = {
+                "date": [date_to_int(bar[0]) for bar in bars],
+                "open": [bar[1] for bar in bars],
+                "high": [bar[2] for bar in bars],
+                "low": [bar[3] for bar in bars],
+                "close": [bar[4] for bar in bars],
+            }
+            for column, dtype in COLUMNS.items():
+                with open(self._path(symbol, frequency, column), "ab") as f:
+                    np.asarray(values[column], dtype=dtype).tofile(f)
+
+    def replace_last(self, symbol, bar, frequency="weekly"):
+        """Overwrite the most recent bar (e.g. the current, still changing week)"""
+        with self._lock:
+            length = self._length(symbol, frequency)
+            if length == 0:
+                raise ValueError(f"No bars stored for {symbol}")
+            self._truncate(symbol, frequency, length)
+            values = dict(zip(COLUMNS, (date_to_int(bar[0]),) + tuple(bar[1:5])))
+            for column, dtype in COLUMNS.items():
+                with open(self._path(symbol, frequency, column), "r+b") as f:
+                    f.seek((length - 1) * dtype.itemsize)
+                    np.asarray([values[column]], dtype=dtype).tofile(f)
+
+price_store = ColumnarPriceStore()
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+# Alpha Vantage free tier limits
+CALLS_PER_MINUTE = 5
+CALLS_PER_DAY = 25
+
+# Longest we are willing to wait for a token before giving up on a call
+MAX_WAIT_SECONDS = 90
+
+class RateLimitExceeded(Exception):
+    """Raised when no token will be free within the allowed wait"""
+
+    def __init__(self, wait_seconds):
+        super().__init__(f"API quota exhausted, next call possible in {wait_seconds / 60:.0f} minute(s)")
+        self.wait_seconds = wait_seconds
+
+class TokenBucket:
+    """Classic token bucket: `capacity` tokens, refilled evenly over `period` seconds"""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` tokens are available (0 if available now)"""
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+class RateLimiter:
+    """Per-minute and per-day token buckets shared by every session in the process"""
+
+    def __init__(self, calls_per_minute=CALLS_PER_MINUTE, calls_per_day=CALLS_PER_DAY):
+        self.minute = TokenBucket(calls_per_minute, 60)
+        self.day = TokenBucket(calls_per_day, 24 * 60 * 60)
+        self._lock = threading.Lock()
+
+    def _try_take(self):
+        """Take a token from both buckets, or return how long to wait for one"""
+        with self._lock:
+            now = time.monotonic()
+            self.minute.refill(now)
+            self.day.refill(now)
+            wait = max(self.minute.wait_time(), self.day.wait_time())
+            if wait == 0:
+                self.minute.tokens -= 1
+                self.day.tokens -= 1
+            return wait
+
+    def try_acquire(self):
+        """Take a token only if one is free right now"""
+        return self._try_take() == 0
+
+    def acquire(self, max_wait=MAX_WAIT_SECONDS):
+        """Block until a token is free; raise RateLimitExceeded if that is more than `max_wait` away"""
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return
+            if wait > max_wait:
+                raise RateLimitExceeded(wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, max_wait=MAX_WAIT_SECONDS):
+        """Async version of acquire() for the fetch engine"""
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return
+            if wait > max_wait:
+                raise RateLimitExceeded(wait)
+            await asyncio.sleep(wait)
+
+    def estimate_wait(self, calls):
+        """Rough number of seconds needed to make `calls` more API calls"""
+        with self._lock:
+            now = time.monotonic()
+            self.minute.refill(now)
+            self.day.refill(now)
+            return max(self.minute.wait_time(calls), self.day.wait_time(calls))
+
+    def status(self):
+        """Whole tokens currently available as (per_minute, per_day)"""
+        with self._lock:
+            now = time.monotonic()
+            self.minute.refill(now)
+            self.day.refill(now)
+            return int(self.minute.tokens), int(self.day.tokens)
+
+# One limiter per API key for the whole process, since the quota belongs to the key
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(api_key, calls_per_minute=CALLS_PER_MINUTE, calls_per_day=CALLS_PER_DAY):
+    with _limiters_lock:
+        if api_key not in _limiters:
+            _limiters[api_key] = RateLimiter(calls_per_minute, calls_per_day)
+        return _limiters[api_key]
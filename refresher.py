@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta
+from database import database_available, get_cache_updated_times, get_popular_stocks, get_watchlist_symbol_counts
+from rate_limiter import get_rate_limiter
+from stock_fetcher import refresh_stock
+from stock_quote import CACHE_TTL_MINUTES
+
+REFRESH_MARGIN_MINUTES = 3  # Re-fetch this long before a cached row expires
+CHECK_INTERVAL_SECONDS = 60
+POPULAR_LIMIT = 10
+
+# Quota left untouched for interactive users; a refresh costs up to 3 calls
+MINUTE_RESERVE = 2
+DAY_RESERVE = 10
+CALLS_PER_REFRESH = 3
+
+class RefreshAheadWorker:
+    """Background thread that keeps watchlist and popular symbols warm in stock_cache"""
+
+    def __init__(self, supabase, api_key):
+        self.supabase = supabase
+        self.api_key = api_key
+        self.last_run = None
+        self.last_error = None
+        self.refreshed_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="refresh-ahead", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            self.last_run = datetime.now()
+            self._stop.wait(CHECK_INTERVAL_SECONDS)
+
+    def due_symbols(self):
+        """Symbols whose cached row is missing or about to expire, highest priority first"""
+        priorities = get_watchlist_symbol_counts(self.supabase)
+        popular = get_popular_stocks(self.supabase, POPULAR_LIMIT)
+        for rank, stock in enumerate(popular):
+            priorities[stock["symbol"]] = priorities.get(stock["symbol"], 0) + (len(popular) - rank)
+        if not priorities:
+            return []
+
+        updated_times = get_cache_updated_times(self.supabase, priorities.keys())
+        refresh_before = datetime.now() - timedelta(minutes=CACHE_TTL_MINUTES - REFRESH_MARGIN_MINUTES)
+        due = [symbol for symbol in priorities if updated_times.get(symbol, datetime.min) < refresh_before]
+        return sorted(due, key=lambda symbol: (-priorities[symbol], updated_times.get(symbol, datetime.min)))
+
+    def refresh_due(self):
+        if not database_available(self.supabase):
+            return  # Cache times are unknown and writes would only queue up; wait for the database
+        limiter = get_rate_limiter(self.api_key)
+        for symbol in self.due_symbols():
+            if self._stop.is_set():
+                return
+            calls_now, calls_today = limiter.status()
+            if calls_now < MINUTE_RESERVE + CALLS_PER_REFRESH or calls_today < DAY_RESERVE + CALLS_PER_REFRESH:
+                return  # Leave the rest of the quota to users; try again next cycle
+            stock_data = refresh_stock(symbol, self.api_key, self.supabase)
+            if stock_data.ok:
+                self.refreshed_count += 1
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_refresh_worker(supabase, api_key):
+    """Start the process-wide refresher once; later calls return the running worker"""
+    global _worker
+    with _worker_lock:
+        if _worker is None and supabase and api_key:
+            _worker = RefreshAheadWorker(supabase, api_key)
+            _worker.start()
+        return _worker
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", os.path.join(".cache", "responses"))
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("RESPONSE_CACHE_MAX_MB", "200"))
+
+# Seconds a stored response is served without asking Alpha Vantage; endpoints not listed are never cached
+FRESHNESS_SECONDS = {
+    "GLOBAL_QUOTE": 60,
+    "REALTIME_BULK_QUOTES": 60,
+    "TIME_SERIES_WEEKLY_ADJUSTED": 60 * 60,
+    "OVERVIEW": 7 * 24 * 60 * 60,
+}
+
+# How long the running size estimate is trusted before a full rescan, since other
+# instances sharing the directory add bodies it does not see
+SIZE_RESYNC_SECONDS = 5 * 60
+# Eviction frees space down to this share of the limit, so scans are not repeated on every put
+EVICT_TO_FRACTION = 0.9
+# Unreferenced bodies and temp files younger than this may belong to a write still in progress
+ORPHAN_GRACE_SECONDS = 10 * 60
+
+# Request parameters that never go into the cache key
+_UNKEYED_PARAMS = {"apikey"}
+
+def cache_key(params):
+    """Stable key for a request: endpoint and parameters, without the API key"""
+    keyed = {name: value for name, value in params.items() if name not in _UNKEYED_PARAMS}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True).encode()).hexdigest()
+
+def _write_atomic(path, data):
+    """Write via a temp file and rename, so readers (including other instances) never see partial files"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class BodyWriter:
+    """Compresses and hashes a response body chunk by chunk into a temp file, so a large
+    body is never held in memory whole. `close()` moves it to its content-addressed path."""
+
+    def __init__(self, bodies_dir):
+        self.bodies_dir = bodies_dir
+        os.makedirs(bodies_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=bodies_dir, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._zlib = zlib.compressobj(6)
+        self.size = 0  # Compressed bytes written
+
+    def write(self, chunk):
+        self._hash.update(chunk)
+        self._write(self._zlib.compress(chunk))
+
+    def _write(self, data):
+        self._file.write(data)
+        self.size += len(data)
+
+    def close(self):
+        """Finish the body and return its digest and whether it was new"""
+        self._write(self._zlib.flush())
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path = os.path.join(self.bodies_dir, f"{digest}.z")
+        if os.path.exists(path):
+            self.discard()
+            return digest, False
+        os.replace(self._tmp_path, path)
+        return digest, True
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
+
+class CachedResponse:
+    """A stored response body and the validators needed to revalidate it"""
+
+    def __init__(self, key, body, stored_at, etag, fresh):
+        self.key = key
+        self.body = body
+        self.stored_at = stored_at
+        self.etag = etag
+        self.fresh = fresh
+
+class ResponseCache:
+    """On-disk cache of raw Alpha Vantage responses.
+
+    Entries (`entries/<key>.json`) point at zlib-compressed bodies stored
+    under the hash of their content (`bodies/<sha256>.z`), so identical
+    payloads are kept once. Least recently used entries are evicted once
+    the bodies exceed `max_bytes`. All writes are atomic renames, so the
+    directory can be shared by several app instances.
+    """
+
+    def __init__(self, directory=RESPONSE_CACHE_DIR, max_bytes=int(RESPONSE_CACHE_MAX_MB * 1024 * 1024), freshness=FRESHNESS_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.freshness = freshness
+        self.hits = 0
+        self.revalidated = 0
+        self.stores = 0
+        self._evict_lock = threading.Lock()
+        self._size = None  # Running estimate of the stored bodies' size, resynced by evict()
+        self._size_checked_at = 0.0
+        self._references = None  # digest -> entries pointing at it, as of the last scan plus our commits
+
+    def cacheable(self, params):
+        return self.freshness.get(params.get("function"), 0) > 0
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, "entries", f"{key}.json")
+
+    def _body_path(self, digest):
+        return os.path.join(self.directory, "bodies", f"{digest}.z")
+
+    def get(self, params):
+        """Stored response for `params` (fresh or not), or None"""
+        if not self.cacheable(params):
+            return None
+        key = cache_key(params)
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                entry = json.loads(f.read())
+            with open(self._body_path(entry["digest"]), "rb") as f:
+                body = zlib.decompress(f.read())
+        except (OSError, ValueError, KeyError, zlib.error):
+            return None  # Missing, evicted or half-written by another instance
+
+        try:
+            os.utime(entry_path)  # Mark as recently used for eviction
+        except OSError:
+            pass
+        age = time.time() - entry["stored_at"]
+        return CachedResponse(key, body, entry["stored_at"], entry.get("etag"), age < self.freshness[params["function"]])
+
+    def get_fresh(self, params):
+        """Body of a stored response still within its endpoint's freshness window, or None"""
+        cached = self.get(params)
+        if cached is None or not cached.fresh:
+            return None
+        self.hits += 1
+        return cached.body
+
+    def open_body(self):
+        """A BodyWriter for a response body that is still streaming in; store it with commit()"""
+        return BodyWriter(os.path.join(self.directory, "bodies"))
+
+    def put(self, params, body, etag=None):
+        if not self.cacheable(params):
+            return
+        writer = self.open_body()
+        try:
+            writer.write(body)
+        except Exception:
+            writer.discard()
+            raise
+        self.commit(params, writer, etag)
+
+    def _entry_digest(self, entry_path):
+        try:
+            with open(entry_path, "rb") as f:
+                return json.loads(f.read())["digest"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def commit(self, params, writer, etag=None):
+        """Store the body written to `writer` as the response for `params`.
+
+        The body the entry pointed at before is deleted once no entry known
+        to this instance references it (another instance sharing the
+        directory would at worst see a cache miss).
+        """
+        digest, new_body = writer.close()
+        entry_path = self._entry_path(cache_key(params))
+        old_digest = self._entry_digest(entry_path)
+        entry = {"function": params["function"], "symbol": params.get("symbol"), "digest": digest, "etag": etag, "stored_at": time.time()}
+        _write_atomic(entry_path, json.dumps(entry).encode())
+        self.stores += 1
+        with self._evict_lock:
+            if self._size is not None and new_body:
+                self._size += writer.size
+            if self._references is not None and old_digest != digest:
+                self._references[digest] = self._references.get(digest, 0) + 1
+                if old_digest:
+                    self._release_body(old_digest)
+            over_limit = self._size is None or self._size > self.max_bytes or time.time() - self._size_checked_at > SIZE_RESYNC_SECONDS
+        if over_limit:
+            self.evict()
+
+    def touch(self, cached):
+        """Restart the freshness window of a response the server confirmed unchanged (HTTP 304)"""
+        entry_path = self._entry_path(cached.key)
+        try:
+            with open(entry_path, "rb") as f:
+                entry = json.loads(f.read())
+            entry["stored_at"] = time.time()
+            _write_atomic(entry_path, json.dumps(entry).encode())
+            self.revalidated += 1
+        except (OSError, ValueError):
+            pass
+
+    def _release_body(self, digest):
+        """Drop one reference to a body, deleting it when none are left (call with _evict_lock held)"""
+        count = self._references.get(digest, 1) - 1
+        if count > 0:
+            self._references[digest] = count
+            return
+        self._references.pop(digest, None)
+        path = self._body_path(digest)
+        try:
+            size = os.path.getsize(path)
+            os.unlink(path)
+        except OSError:
+            return
+        if self._size is not None:
+            self._size -= size
+
+    def _remove_orphans(self, referenced):
+        """Delete bodies no entry references and temp files left by dead writers"""
+        bodies_dir = os.path.join(self.directory, "bodies")
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for name in os.listdir(bodies_dir) if os.path.isdir(bodies_dir) else []:
+            if name.endswith(".z") and name[:-2] in referenced:
+                continue
+            path = os.path.join(bodies_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                continue
+
+    def evict(self):
+        """Drop least recently used entries until the stored bodies fit in `max_bytes`,
+        and remove bodies and temp files that nothing points at.
+
+        Scans every entry, so commit() only calls it when its running size
+        estimate crosses the limit or is older than SIZE_RESYNC_SECONDS.
+        """
+        with self._evict_lock:
+            entries = []
+            entries_dir = os.path.join(self.directory, "entries")
+            for name in os.listdir(entries_dir) if os.path.isdir(entries_dir) else []:
+                path = os.path.join(entries_dir, name)
+                try:
+                    with open(path, "rb") as f:
+                        digest = json.loads(f.read())["digest"]
+                    entries.append((os.path.getmtime(path), path, digest))
+                except (OSError, ValueError, KeyError):
+                    continue
+
+            sizes = {}
+            for _, _, digest in entries:
+                if digest not in sizes:
+                    try:
+                        sizes[digest] = os.path.getsize(self._body_path(digest))
+                    except OSError:
+                        sizes[digest] = 0
+            references = {}
+            for _, _, digest in entries:
+                references[digest] = references.get(digest, 0) + 1
+            self._references = references
+            self._remove_orphans(references)
+
+            total = sum(sizes.values())
+            self._size = total
+            self._size_checked_at = time.time()
+            if total <= self.max_bytes:
+                return
+
+            target = self.max_bytes * EVICT_TO_FRACTION
+            for _, path, digest in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                references[digest] -= 1
+                if references[digest] == 0:
+                    del references[digest]
+                    try:
+                        os.unlink(self._body_path(digest))
+                    except OSError:
+                        pass
+                    total -= sizes[digest]
+            self._size = total
+
+    def size_bytes(self):
+        bodies_dir = os.path.join(self.directory, "bodies")
+        if not os.path.isdir(bodies_dir):
+            return 0
+        total = 0
+        for name in os.listdir(bodies_dir):
+            try:
+                total += os.path.getsize(os.path.join(bodies_dir, name))
+            except OSError:
+                continue  # Evicted meanwhile
+        return total
+
+response_cache = ResponseCache()
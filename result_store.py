@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from local_cache import LRUCache, MISSING
+
+VERSIONS_PER_SYMBOL = 3  # Data timestamps kept per symbol for new lookups
+RESULT_SET_TTL_SECONDS = 24 * 60 * 60
+MAX_RESULT_SETS = 1024
+
+class ResultStore:
+    """Process-wide store of StockQuote records shared by every session.
+
+    Successful quotes are interned by symbol and data timestamp (and
+    whether they came from the cache): every session that sees the same
+    data gets the same immutable instance, so memory grows with distinct
+    symbols rather than sessions times symbols. A
+    session's results are saved as a result set, an immutable tuple of
+    references under a short id, which a reloaded page can look up again.
+    """
+
+    def __init__(self, versions_per_symbol=VERSIONS_PER_SYMBOL, max_result_sets=MAX_RESULT_SETS, result_set_ttl=RESULT_SET_TTL_SECONDS):
+        self.versions_per_symbol = versions_per_symbol
+        self._versions = {}  # symbol -> OrderedDict(updated_at -> {cached: quote}), oldest first
+        self._lock = threading.Lock()
+        self._result_sets = LRUCache(max_entries=max_result_sets, ttl=result_set_ttl)
+
+    def intern(self, quote):
+        """The shared instance equal to `quote`; failures are returned as-is"""
+        if not quote.ok or quote.updated_at is None:
+            return quote
+        with self._lock:
+            versions = self._versions.setdefault(quote.symbol, OrderedDict())
+            copies = versions.get(quote.updated_at)
+            if copies is None:
+                versions[quote.updated_at] = copies = {}
+                while len(versions) > self.versions_per_symbol:
+                    versions.popitem(last=False)
+            return copies.setdefault(quote.cached, quote)
+
+    def save_result_set(self, quotes):
+        """Store a session's results and return the id to load them by"""
+        quotes = tuple(self.intern(quote) for quote in quotes)
+        versions = "|".join(f"{quote.symbol}@{quote.updated_at.isoformat() if quote.ok else quote.error}" for quote in quotes)
+        result_set_id = hashlib.sha256(versions.encode()).hexdigest()[:16]
+        self._result_sets.set(result_set_id, quotes)
+        return result_set_id
+
+    def load_result_set(self, result_set_id):
+        """Results saved under `result_set_id` as a new list, or None if unknown or expired"""
+        quotes = self._result_sets.get(result_set_id)
+        return None if quotes is MISSING else list(quotes)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(copies) for versions in self._versions.values() for copies in versions.values())
+
+result_store = ResultStore()
@@ -0,0 +1,32 @@
+import os
+import streamlit as st
+
+# Where Streamlit looks for secrets.toml by default (global, then project)
+SECRETS_FILES = (
+    os.path.join(os.path.expanduser("~"), ".streamlit", "secrets.toml"),
+    os.path.join(".streamlit", "secrets.toml"),
+)
+
+# Value shipped in the example secrets.toml; treated as no key
+PLACEHOLDER_API_KEY = "your_api_key_here"
+
+# Read secrets.toml once per process. Without one, st.secrets shows a "No secrets files found"
+# error on every access, so it is not touched at all (the offline / CI setup).
+@st.cache_resource
+def _secrets():
+    if not any(os.path.exists(path) for path in SECRETS_FILES):
+        return {}
+    try:
+        return st.secrets.to_dict()
+    except Exception:
+        return {}
+
+# A setting from secrets.toml, falling back to the environment variable of the same name
+def get_setting(name, default=None):
+    value = _secrets().get(name)
+    return value if value else os.environ.get(name, default)
+
+# The server's Alpha Vantage key, or None when it is missing or still the placeholder
+def server_api_key():
+    api_key = get_setting("ALPHA_VANTAGE_API_KEY")
+    return api_key if api_key and api_key != PLACEHOLDER_API_KEY else None
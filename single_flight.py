@@ -0,0 +1,57 @@
+import asyncio
+import concurrent.futures
+import threading
+
+class _LeaderCancelled(Exception):
+    """The caller doing the work was cancelled before it finished"""
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into a single execution.
+
+    Streamlit sessions run in separate threads, each with its own event
+    loop, so the shared result is a concurrent.futures.Future that any
+    loop can await.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    async def do(self, key, make_coro):
+        """Return the result of `make_coro()`, sharing it with callers that ask for `key` meanwhile"""
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._in_flight[key] = future
+
+            if leader:
+                return await self._lead(key, future, make_coro)
+
+            try:
+                # shield() so a cancelled follower doesn't cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                continue  # Try again, possibly becoming the leader
+
+    async def _lead(self, key, future, make_coro):
+        try:
+            result = await make_coro()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._in_flight
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+from database import cache_stock_data, get_cached_stock_data, get_cached_stock_data_bulk, cache_company_metadata, get_cached_company_metadata, record_stock_view
+from rate_limiter import get_rate_limiter, RateLimitExceeded
+from single_flight import SingleFlight
+from weekly_bars import weekly_bar_store, weekly_bar, parse_weekly_bars, week_start, WINDOW_WEEKS
+from stream_parser import parse_time_series
+from negative_cache import negative_cache, is_invalid_symbol_error, INVALID, TRANSIENT
+from response_cache import response_cache
+from stock_quote import StockQuote
+from result_store import result_store
+
+# Overridable so a local mock server can stand in for Alpha Vantage
+ALPHA_VANTAGE_URL = os.environ.get("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+REQUEST_TIMEOUT = 30  # seconds per HTTP call
+MAX_CONCURRENT_CALLS = 5
+CANCEL_POLL_SECONDS = 0.25  # How often a cancellable run checks its cancel event
+
+# REALTIME_BULK_QUOTES takes up to 100 symbols per call (premium keys only). It is opt-in:
+# set ALPHA_VANTAGE_PREMIUM=1 in the environment (read at startup) so free keys never spend a call on it
+BULK_QUOTES_ENABLED = os.environ.get("ALPHA_VANTAGE_PREMIUM", "").lower() in ("1", "true", "yes")
+BULK_QUOTE_SIZE = 100
+BULK_RETRY_SECONDS = 6 * 60 * 60  # How long to skip bulk quotes after a key is refused
+
+# API key -> time.monotonic() after which bulk quotes may be tried again
+_bulk_refused_until = {}
+
+# Stale cache rows are served immediately and refreshed in the background, up to this age;
+# older rows force a synchronous fetch
+MAX_STALENESS_MINUTES = 24 * 60
+REVALIDATE_WORKERS = 2
+
+# Sessions asking for the same symbol at the same time share one fetch
+_symbol_flights = SingleFlight()
+
+_revalidate_pool = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="revalidate")
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+class RateBudget:
+    """Per-run concurrency cap on top of the process-wide rate limiter for the API key"""
+
+    def __init__(self, api_key, max_concurrent=MAX_CONCURRENT_CALLS):
+        self.limiter = get_rate_limiter(api_key)
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def acquire(self):
+        await self.limiter.acquire_async()
+
+def _params(function, symbol, extra_params):
+    return {"function": function, "symbol": symbol, **extra_params}
+
+# Only complete, successful payloads go into the response cache
+def _storable(data):
+    return not any(key in data for key in ("Error Message", "Note", "Information")) and data.get("Global Quote") != {}
+
+def _body_chunks(body, chunk_size=16 * 1024):
+    for i in range(0, len(body), chunk_size):
+        yield body[i:i + chunk_size]
+
+# Blocking HTTP call, run in a worker thread by the engine
+def _request_json(function, symbol, api_key, use_cache=True, **extra_params):
+    params = _params(function, symbol, extra_params)
+    cached = response_cache.get(params) if use_cache else None
+    headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+    response = requests.get(ALPHA_VANTAGE_URL, params={**params, "apikey": api_key}, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 304 and cached:
+        response_cache.touch(cached)
+        return json.loads(cached.body)
+
+    data = response.json()
+    if _storable(data):
+        response_cache.put(params, response.content, response.headers.get("ETag"))
+    return data
+
+# Blocking streamed call that stops parsing once enough time series entries are read
+def _request_series(function, symbol, api_key, series_key, limit, stop_before, rest=None, use_cache=True, **extra_params):
+    params = _params(function, symbol, extra_params)
+    cached = response_cache.get(params) if use_cache else None
+    headers = {"If-None-Match": cached.etag} if cached and cached.etag else {}
+    with requests.get(ALPHA_VANTAGE_URL, params={**params, "apikey": api_key}, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as response:
+        if response.status_code == 304 and cached:
+            response_cache.touch(cached)
+            return parse_time_series(_body_chunks(cached.body), series_key, limit, stop_before, rest)
+
+        # Tee the body into the cache as it streams, compressed on the way to disk
+        writer = response_cache.open_body() if response_cache.cacheable(params) else None
+        def chunks():
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                if writer:
+                    writer.write(chunk)
+                yield chunk
+        stream = chunks()
+        try:
+            data = parse_time_series(stream, series_key, limit, stop_before, rest)
+            if writer and series_key in data:
+                # Parsing stopped early; read the rest so the complete body is stored
+                for _ in stream:
+                    pass
+                response_cache.commit(params, writer, response.headers.get("ETag"))
+                writer = None
+            return data
+        finally:
+            if writer:
+                writer.discard()
+
+# Responses still fresh on disk are served without spending a rate-limit token
+async def _fresh_body(function, symbol, use_cache, extra_params):
+    if not use_cache:
+        return None
+    return await asyncio.to_thread(response_cache.get_fresh, _params(function, symbol, extra_params))
+
+async def _call_api(budget, function, symbol, api_key, use_cache=True, **extra_params):
+    body = await _fresh_body(function, symbol, use_cache, extra_params)
+    if body is not None:
+        return json.loads(body)
+    await budget.acquire()
+    async with budget.semaphore:
+        return await asyncio.to_thread(_request_json, function, symbol, api_key, use_cache, **extra_params)
+
+async def _call_series_api(budget, function, symbol, api_key, series_key, limit=None, stop_before=None, rest=None, use_cache=True, **extra_params):
+    body = await _fresh_body(function, symbol, use_cache, extra_params)
+    if body is not None:
+        return await asyncio.to_thread(parse_time_series, _body_chunks(body), series_key, limit, stop_before, rest)
+    await budget.acquire()
+    async with budget.semaphore:
+        return await asyncio.to_thread(_request_series, function, symbol, api_key, series_key, limit, stop_before, rest, use_cache, **extra_params)
+
+# Map Alpha Vantage error payloads to our result format
+def _api_error(symbol, data):
+    if "Error Message" in data:
+        return StockQuote.failure(symbol, data['Error Message'])
+    if "Note" in data:
+        return StockQuote.failure(symbol, f"Rate limit: {data['Note']}", status='rate_limit')
+    if "Information" in data:
+        return StockQuote.failure(symbol, f"API Info: {data['Information']}", status='rate_limit')
+    return None
+
+def bulk_quotes_available(api_key):
+    return BULK_QUOTES_ENABLED and time.monotonic() >= _bulk_refused_until.get(api_key, 0)
+
+def plan_quote_batches(symbols, api_key):
+    """Split symbols into batches that each need a single bulk quote call, or one batch without bulk"""
+    if not symbols:
+        return []
+    if len(symbols) > 1 and bulk_quotes_available(api_key):
+        return [symbols[i:i + BULK_QUOTE_SIZE] for i in range(0, len(symbols), BULK_QUOTE_SIZE)]
+    return [symbols]
+
+def estimate_api_calls(symbols, api_key):
+    """Upper bound on API calls needed to fetch `symbols` (cache hits need none)"""
+    if len(symbols) > 1 and bulk_quotes_available(api_key):
+        return len(plan_quote_batches(symbols, api_key)) + len(symbols) * 2
+    return len(symbols) * 3
+
+async def fetch_bulk_quotes(symbols, api_key, budget):
+    """Return {symbol: price} from REALTIME_BULK_QUOTES; symbols missing from it need GLOBAL_QUOTE"""
+    prices = {}
+    for i in range(0, len(symbols), BULK_QUOTE_SIZE):
+        if not bulk_quotes_available(api_key):
+            break
+        try:
+            data = await _call_api(budget, "REALTIME_BULK_QUOTES", ",".join(symbols[i:i + BULK_QUOTE_SIZE]), api_key)
+        except Exception:
+            break  # Fall back to per-symbol quotes
+
+        rows = data.get("data")
+        if "Note" in data:
+            break  # Per-minute limit hit, the key may still support bulk
+        if "Error Message" in data or "Information" in data or not isinstance(rows, list):
+            _bulk_refused_until[api_key] = time.monotonic() + BULK_RETRY_SECONDS
+            break
+
+        for row in rows:
+            try:
+                prices[row["symbol"].upper()] = float(row["close"])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                continue
+    return prices
+
+def lookup_cached(symbols, api_key, supabase):
+    """Split symbols into cached results and symbols that need fetching, using one cache query.
+
+    Stale hits are returned too and queued for background revalidation.
+    Each hit counts as a view of the symbol, like a fetched result does.
+    """
+    cached = get_cached_stock_data_bulk(supabase, symbols, max_stale_minutes=MAX_STALENESS_MINUTES)
+    hits = []
+    misses = []
+    for symbol in symbols:
+        cached_data = cached.get(symbol)
+        if cached_data:
+            if cached_data.stale:
+                revalidate_in_background(symbol, api_key, supabase)
+            record_stock_view(supabase, symbol, cached_data.company_name)
+            hits.append(cached_data)
+        else:
+            misses.append(symbol)
+    return hits, misses
+
+def revalidate_in_background(symbol, api_key, supabase):
+    """Refresh a stale symbol on the background pool, at most once at a time per symbol"""
+    with _revalidating_lock:
+        if symbol in _revalidating:
+            return
+        _revalidating.add(symbol)
+
+    def revalidate():
+        try:
+            refresh_stock(symbol, api_key, supabase)
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(symbol)
+
+    _revalidate_pool.submit(revalidate)
+
+def is_revalidating(symbol):
+    with _revalidating_lock:
+        return symbol in _revalidating
+
+async def get_stock_info(symbol, api_key, supabase, budget, current_price=None, use_cache=True):
+    """Fetch quote, name and 52-week range for one symbol, running the API calls concurrently.
+
+    `current_price` comes from a bulk quote when available, saving the GLOBAL_QUOTE call.
+    """
+    # Try to get cached data first
+    if use_cache:
+        cached_data = await asyncio.to_thread(get_cached_stock_data, supabase, symbol, max_stale_minutes=MAX_STALENESS_MINUTES)
+        if cached_data:
+            if cached_data.stale:
+                revalidate_in_background(symbol, api_key, supabase)
+            return cached_data
+
+    # Reject symbols that failed recently without spending quota
+    failure = negative_cache.lookup(symbol)
+    if failure:
+        return failure
+
+    # Only bars newer than the local weekly store are needed once it has history
+    # (weekly endpoints currently return full history regardless of outputsize)
+    # Company metadata has its own long-lived cache, so OVERVIEW is usually skipped
+    symbol_bars, metadata = await asyncio.gather(
+        asyncio.to_thread(weekly_bar_store.get, symbol),
+        asyncio.to_thread(get_cached_company_metadata, supabase, symbol)
+    )
+    last_bar_date = symbol_bars.last_date
+    outputsize = "compact" if last_bar_date else "full"
+
+    if current_price is None:
+        quote_task = asyncio.create_task(_call_api(budget, "GLOBAL_QUOTE", symbol, api_key, use_cache))
+    # Stream the weekly series down to the bars we already have (all of it on a first load).
+    # Weeks past the 52-week window are kept as bars for the price store, so neither a first
+    # load nor catching up after a long gap leaves holes in the stored history.
+    stop_before = week_start(last_bar_date) if last_bar_date else None
+    history = []
+    collect_history = lambda day, values: history.append(weekly_bar(day, values))
+    weekly_task = asyncio.create_task(_call_series_api(
+        budget, "TIME_SERIES_WEEKLY_ADJUSTED", symbol, api_key, "Weekly Adjusted Time Series",
+        limit=WINDOW_WEEKS, stop_before=stop_before, rest=collect_history, use_cache=use_cache, outputsize=outputsize
+    ))
+    pending = [weekly_task]
+    if not metadata:
+        overview_task = asyncio.create_task(_call_api(budget, "OVERVIEW", symbol, api_key, use_cache))
+        pending.append(overview_task)
+
+    try:
+        if current_price is None:
+            quote_data = await quote_task
+            error = _api_error(symbol, quote_data)
+            if error:
+                if is_invalid_symbol_error(quote_data.get("Error Message", "")):
+                    negative_cache.record(symbol, INVALID, error.error)
+                return error
+
+            global_quote = quote_data.get("Global Quote")
+            if not global_quote:
+                negative_cache.record(symbol, TRANSIENT, 'No quote data available')
+                return StockQuote.failure(symbol, 'No quote data available')
+            if "05. price" not in global_quote:
+                return StockQuote.failure(symbol, 'Price data not available')
+            current_price = float(global_quote["05. price"])
+
+        if metadata:
+            company_name = metadata['company_name']
+        else:
+            overview_data = await overview_task
+            if "Name" in overview_data:
+                company_name = overview_data["Name"]
+                metadata = {
+                    'company_name': company_name,
+                    'exchange': overview_data.get("Exchange"),
+                    'sector': overview_data.get("Sector")
+                }
+                await asyncio.to_thread(cache_company_metadata, supabase, symbol, metadata)
+            else:
+                company_name = symbol
+
+        weekly_data = await weekly_task
+        error = _api_error(symbol, weekly_data)
+        if error:
+            if is_invalid_symbol_error(weekly_data.get("Error Message", "")):
+                negative_cache.record(symbol, INVALID, error.error)
+            return error
+        if "Weekly Adjusted Time Series" not in weekly_data:
+            return StockQuote.failure(symbol, 'No historical data available')
+
+        new_bars = parse_weekly_bars(weekly_data["Weekly Adjusted Time Series"], since=last_bar_date)
+        history.reverse()  # Collected newest first
+        fifty_two_week_low, fifty_two_week_high = await asyncio.to_thread(weekly_bar_store.update, symbol, new_bars, history)
+        if not (fifty_two_week_low and fifty_two_week_high):
+            return StockQuote.failure(symbol, 'Could not calculate 52-week range')
+
+        stock_data = StockQuote(
+            symbol,
+            current_price=current_price,
+            week_52_low=fifty_two_week_low,
+            week_52_high=fifty_two_week_high,
+            company_name=company_name,
+            updated_at=datetime.now()
+        )
+
+        # Cache the data
+        await asyncio.to_thread(cache_stock_data, supabase, symbol, stock_data)
+
+        return stock_data
+
+    except RateLimitExceeded as e:
+        return StockQuote.failure(symbol, str(e), status='rate_limit')
+    except Exception as e:
+        return StockQuote.failure(symbol, str(e))
+    finally:
+        # Don't spend quota on calls whose result is no longer needed
+        for task in pending:
+            task.cancel()
+
+async def get_stock_info_shared(symbol, api_key, supabase, budget, current_price=None, use_cache=True):
+    """get_stock_info, coalesced with any lookup of the same symbol already in progress"""
+    return await _symbol_flights.do(symbol, lambda: get_stock_info(symbol, api_key, supabase, budget, current_price, use_cache))
+
+async def stream_stock_info(symbols, api_key, supabase, budget=None):
+    """Yield results for all symbols as each one completes, counting a view for each success"""
+    budget = budget or RateBudget(api_key)
+
+    # Yield cache hits first so the bulk quote call only covers misses
+    hits, misses = await asyncio.to_thread(lookup_cached, symbols, api_key, supabase)
+    for cached_data in hits:
+        yield cached_data
+
+    # Known-bad symbols fail at once and stay out of the bulk quote call
+    to_fetch = []
+    for symbol in misses:
+        failure = negative_cache.lookup(symbol)
+        if failure:
+            yield failure
+        else:
+            to_fetch.append(symbol)
+    misses = to_fetch
+
+    prices = {}
+    if len(misses) > 1 and bulk_quotes_available(api_key):
+        prices = await fetch_bulk_quotes(misses, api_key, budget)
+
+    tasks = [asyncio.create_task(get_stock_info_shared(symbol, api_key, supabase, budget, prices.get(symbol))) for symbol in misses]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            stock_data = await next_done
+            if stock_data.ok:
+                record_stock_view(supabase, stock_data.symbol, stock_data.company_name)
+            yield stock_data
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def _fetch_stocks(symbols, api_key, supabase, on_result, cancel=None):
+    results = []
+
+    async def consume():
+        async for stock_data in stream_stock_info(symbols, api_key, supabase):
+            stock_data = result_store.intern(stock_data)
+            results.append(stock_data)
+            if on_result and on_result(stock_data) is False:
+                break
+
+    run = asyncio.create_task(consume())
+    # Watch the cancel event so a run waiting on the rate limiter stops promptly
+    while cancel is not None and not run.done():
+        await asyncio.wait({run}, timeout=CANCEL_POLL_SECONDS)
+        if cancel.is_set():
+            run.cancel()
+    try:
+        await run
+    except asyncio.CancelledError:
+        pass
+    return results
+
+def fetch_stocks(symbols, api_key, supabase, on_result=None, cancel=None):
+    """Fetch several symbols concurrently from synchronous (Streamlit) code.
+
+    `on_result` is called with each result as it completes; returning False
+    from it stops the run and cancels any outstanding requests. Setting the
+    threading.Event `cancel` does the same from another thread.
+    """
+    return asyncio.run(_fetch_stocks(symbols, api_key, supabase, on_result, cancel))
+
+async def _refresh_stock(symbol, api_key, supabase):
+    return await get_stock_info_shared(symbol, api_key, supabase, RateBudget(api_key), use_cache=False)
+
+def refresh_stock(symbol, api_key, supabase):
+    """Re-fetch one symbol from the API even if its cached row is still fresh"""
+    return asyncio.run(_refresh_stock(symbol, api_key, supabase))
@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+CACHE_TTL_MINUTES = 15  # Cached rows older than this are stale
+
+@dataclass(frozen=True, slots=True)
+class StockQuote:
+    """Result for one symbol, from the API or the cache.
+
+    Failed lookups carry `status` ("error" or "rate_limit") and `error`
+    instead of prices. Records are immutable, so one instance can be
+    shared by the cache tiers and every session that shows it.
+    """
+
+    symbol: str
+    status: str = "success"
+    current_price: float = None
+    week_52_low: float = None
+    week_52_high: float = None
+    company_name: str = None
+    updated_at: datetime = None
+    cached: bool = False
+    error: str = None
+    failure_kind: str = None
+
+    @classmethod
+    def failure(cls, symbol, error, status="error", failure_kind=None):
+        return cls(symbol, status=status, error=error, failure_kind=failure_kind)
+
+    @classmethod
+    def from_row(cls, row):
+        """Record for a stock_cache row"""
+        return cls(
+            row["symbol"],
+            current_price=row["current_price"],
+            week_52_low=row["week_52_low"],
+            week_52_high=row["week_52_high"],
+            company_name=row["company_name"],
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            cached=True
+        )
+
+    def to_row(self):
+        """stock_cache row for this record"""
+        return {
+            "symbol": self.symbol,
+            "current_price": self.current_price,
+            "week_52_low": self.week_52_low,
+            "week_52_high": self.week_52_high,
+            "company_name": self.company_name,
+            "updated_at": self.updated_at.isoformat()
+        }
+
+    @property
+    def ok(self):
+        return self.status == "success"
+
+    @property
+    def age_minutes(self):
+        if self.updated_at is None:
+            return 0.0
+        return (datetime.now() - self.updated_at).total_seconds() / 60
+
+    @property
+    def stale(self):
+        return self.cached and self.age_minutes > CACHE_TTL_MINUTES
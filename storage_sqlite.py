@@ -0,0 +1,225 @@
+import os
+import re
+import sqlite3
+import threading
+
+SQLITE_PATH = os.environ.get("SQLITE_PATH", os.path.join(".cache", "stock_tracker.db"))
+
+# SQLite version of database_setup.sql
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_cache (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT UNIQUE NOT NULL,
+    current_price REAL NOT NULL,
+    week_52_low REAL NOT NULL,
+    week_52_high REAL NOT NULL,
+    company_name TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS company_metadata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT UNIQUE NOT NULL,
+    company_name TEXT,
+    exchange TEXT,
+    sector TEXT,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS user_watchlists (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT UNIQUE NOT NULL,
+    watchlist TEXT NOT NULL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS watchlist_items (
+    user_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    added_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, symbol)
+);
+
+CREATE TABLE IF NOT EXISTS stock_views (
+    symbol TEXT PRIMARY KEY,
+    company_name TEXT,
+    view_count INTEGER NOT NULL DEFAULT 0,
+    last_viewed_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_stock_cache_updated_at ON stock_cache(updated_at);
+CREATE INDEX IF NOT EXISTS idx_stock_views_view_count ON stock_views(view_count);
+CREATE INDEX IF NOT EXISTS idx_watchlist_items_user_position ON watchlist_items(user_id, position);
+
+-- Move watchlists saved as JSON blobs into watchlist_items
+INSERT OR IGNORE INTO watchlist_items (user_id, symbol, position)
+    SELECT user_watchlists.user_id, item.value, item.key FROM user_watchlists, json_each(user_watchlists.watchlist) AS item;
+DELETE FROM user_watchlists;
+"""
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+def _identifier(name):
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column or table name: {name!r}")
+    return name
+
+class Result:
+    """Mirrors the `.data` attribute of a Supabase response"""
+
+    def __init__(self, data):
+        self.data = data
+
+class _Query:
+    """The subset of the Supabase query builder that database.py uses, as parameterized SQL"""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = _identifier(table)
+        self._columns = "*"
+        self._where = []
+        self._params = []
+        self._order = ""
+        self._limit = ""
+        self._upsert = None
+        self._delete = False
+
+    def select(self, columns="*"):
+        if columns.strip() != "*":
+            columns = ", ".join(_identifier(column) for column in columns.split(","))
+        self._columns = columns
+        return self
+
+    def eq(self, column, value):
+        self._where.append(f"{_identifier(column)} = ?")
+        self._params.append(value)
+        return self
+
+    def gte(self, column, value):
+        self._where.append(f"{_identifier(column)} >= ?")
+        self._params.append(value)
+        return self
+
+    def in_(self, column, values):
+        values = list(values)
+        self._where.append(f"{_identifier(column)} IN ({', '.join('?' * len(values))})" if values else "0")
+        self._params.extend(values)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = f" ORDER BY {_identifier(column)}{' DESC' if desc else ''}"
+        return self
+
+    def limit(self, count):
+        self._limit = f" LIMIT {int(count)}"
+        return self
+
+    def upsert(self, rows, on_conflict, ignore_duplicates=False):
+        self._upsert = (rows if isinstance(rows, list) else [rows], on_conflict, ignore_duplicates)
+        return self
+
+    def delete(self):
+        self._delete = True
+        return self
+
+    def execute(self):
+        if self._upsert:
+            return self._execute_upsert(*self._upsert)
+        if self._delete:
+            return self._execute_delete()
+
+        sql = f"SELECT {self._columns} FROM {self._table}"
+        if self._where:
+            sql += " WHERE " + " AND ".join(self._where)
+        sql += self._order + self._limit
+        rows = self._client.connection().execute(sql, self._params).fetchall()
+        return Result([dict(row) for row in rows])
+
+    def _execute_upsert(self, rows, on_conflict, ignore_duplicates):
+        if not rows:
+            return Result([])
+        columns = [_identifier(column) for column in rows[0]]
+        conflict = ", ".join(_identifier(column) for column in on_conflict.split(","))
+        if ignore_duplicates:
+            action = "DO NOTHING"
+        else:
+            action = "DO UPDATE SET " + ", ".join(f"{column} = excluded.{column}" for column in columns)
+        sql = (
+            f"INSERT INTO {self._table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT({conflict}) {action}"
+        )
+        connection = self._client.connection()
+        with connection:
+            connection.executemany(sql, [[row[column] for column in columns] for row in rows])
+        return Result(rows)
+
+    def _execute_delete(self):
+        sql = f"DELETE FROM {self._table}"
+        if self._where:
+            sql += " WHERE " + " AND ".join(self._where)
+        connection = self._client.connection()
+        with connection:
+            connection.execute(sql, self._params)
+        return Result([])
+
+# SQLite versions of the database functions in database_setup.sql
+def _increment_stock_views(connection, params):
+    sql = (
+        "INSERT INTO stock_views (symbol, company_name, view_count, last_viewed_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(symbol) DO UPDATE SET view_count = view_count + excluded.view_count, "
+        "company_name = COALESCE(excluded.company_name, company_name), "
+        "last_viewed_at = MAX(last_viewed_at, excluded.last_viewed_at)"
+    )
+    rows = params["views"]
+    with connection:
+        connection.executemany(sql, [[row["symbol"], row.get("company_name"), row["views"], row["last_viewed_at"]] for row in rows])
+    return Result(None)
+
+_FUNCTIONS = {
+    "increment_stock_views": _increment_stock_views,
+}
+
+class _Rpc:
+    """A database function call, as returned by the Supabase client's rpc()"""
+
+    def __init__(self, client, name, params):
+        if name not in _FUNCTIONS:
+            raise ValueError(f"Unknown database function: {name!r}")
+        self._client = client
+        self._function = _FUNCTIONS[name]
+        self._params = params or {}
+
+    def execute(self):
+        return self._function(self._client.connection(), self._params)
+
+class SQLiteClient:
+    """Embedded storage backend usable anywhere database.py expects a Supabase client"""
+
+    backend_name = "SQLite"
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        """One connection per thread; WAL lets readers and the writer work concurrently"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, cached_statements=256)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params=None):
+        return _Rpc(self, name, params)
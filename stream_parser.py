@@ -0,0 +1,107 @@
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_COMPACT_AT = 64 * 1024  # Drop consumed text once this much has piled up
+
+class _Reader:
+    """Text buffer over a stream of byte chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        for chunk in self._chunks:
+            if chunk:
+                self.text += self._utf8.decode(chunk)
+                return True
+        self.text += self._utf8.decode(b"", final=True)
+        self.exhausted = True
+        return False
+
+    def compact(self):
+        if self.pos > _COMPACT_AT:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+
+    def peek(self):
+        """Next non-whitespace character, reading more as needed ('' at end of stream)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in time series response")
+        self.pos += 1
+
+    def decode_value(self):
+        """Decode the JSON value at the current position, reading until it is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number at the end of the buffer may still be cut off
+                if end < len(self.text) or self.exhausted:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.read_more()
+
+def parse_time_series(chunks, series_key, limit=None, stop_before=None, rest=None):
+    """Incrementally parse an Alpha Vantage time series response.
+
+    Reads `chunks` (bytes) only until `limit` entries have been collected or
+    an entry dated before `stop_before` is reached; Alpha Vantage lists the
+    newest entries first. Returns a dict shaped like the full response but
+    holding just those entries under `series_key`. With `rest`, parsing
+    carries on past `limit` and each further entry is passed to
+    `rest(date, values)` instead of being kept. If the response has no
+    such series (an error or rate-limit message), it is parsed whole and
+    returned as-is.
+    """
+    reader = _Reader(chunks)
+    marker = json.dumps(series_key)
+
+    # Find the series, keeping everything read so far in case it isn't there
+    while True:
+        index = reader.text.find(marker)
+        if index >= 0:
+            reader.pos = index + len(marker)
+            break
+        if not reader.read_more():
+            return json.loads(reader.text) if reader.text.strip() else {}
+
+    reader.expect(":")
+    reader.expect("{")
+
+    series = {}
+    first = True
+    while limit is None or len(series) < limit or rest is not None:
+        if reader.peek() == "}":
+            break
+        if not first:
+            reader.expect(",")
+        first = False
+        date = reader.decode_value()
+        if stop_before and date < stop_before:
+            break
+        reader.expect(":")
+        if limit is None or len(series) < limit:
+            series[date] = reader.decode_value()
+        else:
+            rest(date, reader.decode_value())
+        reader.compact()
+
+    return {series_key: series}
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+SUMMARY_COLUMNS = ['Symbol', 'Company', 'Current Price', '52W Low', '52W High', 'Above Low %', 'Below High %', 'Range Position %', 'Status']
+PRICE_COLUMNS = ['Current Price', '52W Low', '52W High']
+PERCENT_COLUMNS = ['Above Low %', 'Below High %', 'Range Position %']
+
+# StockQuote attributes the summary reads
+_QUOTE_FIELDS = ['symbol', 'status', 'company_name', 'current_price', 'week_52_low', 'week_52_high', 'stale', 'age_minutes', 'error']
+
+def build_summary(processed_stocks):
+    """Summary of processed stocks as a DataFrame with numeric price and percentage columns.
+
+    Every derived metric is computed for all rows at once; failed rows get
+    NaN in the numeric columns. Formatting is left to the display layer
+    (see summary_column_config).
+    """
+    if not processed_stocks:
+        return None
+
+    raw = pd.DataFrame({field: [getattr(quote, field) for quote in processed_stocks] for field in _QUOTE_FIELDS})
+    ok = raw['status'].eq('success').to_numpy()
+    price = np.where(ok, pd.to_numeric(raw['current_price'], errors='coerce'), np.nan)
+    low = np.where(ok, pd.to_numeric(raw['week_52_low'], errors='coerce'), np.nan)
+    high = np.where(ok, pd.to_numeric(raw['week_52_high'], errors='coerce'), np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        above_low = (price - low) / low * 100
+        below_high = (high - price) / high * 100
+        range_position = np.where(high > low, (price - low) / (high - low) * 100, np.nan)
+
+    # Non-finite results (zero lows/highs) would sort oddly; show them as missing
+    above_low[~np.isfinite(above_low)] = np.nan
+    below_high[~np.isfinite(below_high)] = np.nan
+
+    stale = ok & raw['stale'].eq(True).to_numpy()
+    error = raw['error'].fillna('Error').astype(str)
+    cached_status = "🕒 Cached " + pd.to_numeric(raw['age_minutes'], errors='coerce').fillna(0).astype(int).astype(str) + " min ago"
+    status = np.select(
+        [stale, ok, raw['status'].eq('rate_limit').to_numpy()],
+        [cached_status, '✅ Success', "🛑 " + error],
+        default="❌ " + error
+    )
+
+    return pd.DataFrame({
+        'Symbol': raw['symbol'],
+        'Company': raw['company_name'].where(ok, 'N/A'),
+        'Current Price': price,
+        '52W Low': low,
+        '52W High': high,
+        'Above Low %': above_low,
+        'Below High %': below_high,
+        'Range Position %': range_position,
+        'Status': status
+    }, columns=SUMMARY_COLUMNS)
+
+def summary_column_config():
+    """Display formats for st.dataframe; the underlying columns stay numeric and sortable"""
+    config = {column: st.column_config.NumberColumn(column, format="$%.2f") for column in PRICE_COLUMNS}
+    config['Above Low %'] = st.column_config.NumberColumn('Above Low %', format="%.1f%%")
+    config['Below High %'] = st.column_config.NumberColumn('Below High %', format="%.1f%%")
+    config['Range Position %'] = st.column_config.ProgressColumn('Range Position %', format="%.0f%%", min_value=0, max_value=100)
+    return config
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The on-disk stores read their directories at import time; keep them out of the working tree
+_cache_dir = tempfile.mkdtemp(prefix="stock-tracker-tests-")
+os.environ.setdefault("RESPONSE_CACHE_DIR", os.path.join(_cache_dir, "responses"))
+os.environ.setdefault("PRICE_STORE_DIR", os.path.join(_cache_dir, "prices"))
+os.environ.setdefault("SQLITE_PATH", os.path.join(_cache_dir, "stock_tracker.db"))
+
+import stock_fetcher
+from negative_cache import NegativeCache
+from price_store import ColumnarPriceStore
+from rate_limiter import get_rate_limiter
+from response_cache import ResponseCache
+from weekly_bars import WeeklyBarStore
+
+BAD_KEY_MESSAGE = "the parameter apikey is invalid or missing. Please claim your free API key on (https://www.alphavantage.co/support/#api-key). It should take less than 20 seconds."
+INVALID_CALL_MESSAGE = "Invalid API call. Please retry or visit the documentation (https://www.alphavantage.co/documentation/) for {function}."
+PREMIUM_MESSAGE = "Thank you for using Alpha Vantage! This is a premium endpoint. You may subscribe to any of the premium plans at https://www.alphavantage.co/premium/ to instantly unlock all premium endpoints"
+
+class MockAlphaVantage:
+    """Local stand-in for the Alpha Vantage API, serving canned payloads and recording every call"""
+
+    def __init__(self):
+        self.calls = []
+        self.premium = False
+        self.bad_keys = set()
+        self.invalid_symbols = set()
+        self.weeks = 5 * 52  # History length of the weekly series
+        self.last_week = date(2026, 10, 16)
+
+    def count(self, function):
+        return sum(1 for call in self.calls if call["function"] == function)
+
+    def weekly_series(self):
+        """Newest first, like the real endpoint; the latest 52 weeks trade between 90 and 110"""
+        series = {}
+        for i in range(self.weeks):
+            day = (self.last_week - timedelta(weeks=i)).isoformat()
+            high, low = (110.0, 90.0) if i < 52 else (500.0, 1.0)
+            series[day] = {"1. open": "100.0", "2. high": str(high), "3. low": str(low), "4. close": "100.0", "5. adjusted close": "100.0", "6. volume": "1000", "7. dividend amount": "0.0000"}
+        return series
+
+    def payload(self, params):
+        function, symbol = params.get("function"), params.get("symbol", "")
+        if params.get("apikey") in self.bad_keys:
+            return {"Error Message": BAD_KEY_MESSAGE}
+        if function == "REALTIME_BULK_QUOTES":
+            if not self.premium:
+                return {"Information": PREMIUM_MESSAGE}
+            return {"endpoint": "Realtime Bulk Quotes", "data": [{"symbol": s, "close": "101.00"} for s in symbol.split(",") if s not in self.invalid_symbols]}
+        if symbol in self.invalid_symbols:
+            return {"Error Message": INVALID_CALL_MESSAGE.format(function=function)}
+        if function == "GLOBAL_QUOTE":
+            return {"Global Quote": {"01. symbol": symbol, "05. price": "100.00"}}
+        if function == "OVERVIEW":
+            return {"Symbol": symbol, "Name": f"{symbol} Inc", "Exchange": "NASDAQ", "Sector": "TECHNOLOGY"}
+        if function == "TIME_SERIES_WEEKLY_ADJUSTED":
+            return {"Meta Data": {"2. Symbol": symbol}, "Weekly Adjusted Time Series": self.weekly_series()}
+        return {"Error Message": INVALID_CALL_MESSAGE.format(function=function)}
+
+def _handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+            mock.calls.append(params)
+            body = json.dumps(mock.payload(params)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+@pytest.fixture
+def alpha_vantage(monkeypatch, tmp_path):
+    """A running MockAlphaVantage, with the fetcher pointed at it through ALPHA_VANTAGE_URL
+    and given empty response, price and failure caches"""
+    mock = MockAlphaVantage()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(mock))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(stock_fetcher, "ALPHA_VANTAGE_URL", f"http://127.0.0.1:{server.server_address[1]}/query")
+    monkeypatch.setattr(stock_fetcher, "response_cache", ResponseCache(str(tmp_path / "responses")))
+    monkeypatch.setattr(stock_fetcher, "weekly_bar_store", WeeklyBarStore(ColumnarPriceStore(str(tmp_path / "prices"))))
+    monkeypatch.setattr(stock_fetcher, "negative_cache", NegativeCache())
+    yield mock
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def api_key():
+    """A fresh API key with a limiter generous enough never to wait"""
+    key = f"test-{uuid.uuid4().hex}"
+    get_rate_limiter(key, 1000, 1000)
+    return key
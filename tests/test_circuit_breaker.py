@@ -0,0 +1,30 @@
+import pytest
+from circuit_breaker import CircuitBreaker, CircuitOpen, OPEN
+
+def test_calls_run_inline_after_pool_shutdown():
+    breaker = CircuitBreaker("db")
+    breaker._pool.shutdown()  # What concurrent.futures does at exit, before atexit flushes
+
+    assert breaker.call(lambda: "written", timeout=1) == "written"
+    assert breaker.failures == 0
+
+def test_slow_inline_call_counts_as_failure(monkeypatch):
+    breaker = CircuitBreaker("db", failure_threshold=1)
+    clock = iter([0.0, 5.0, 5.0, 5.0])
+    monkeypatch.setattr("circuit_breaker.time.monotonic", lambda: next(clock))
+
+    assert breaker.call(lambda: "done", timeout=1, inline=True) == "done"
+    assert breaker.state == OPEN
+    assert "over 1s" in breaker.last_error
+
+def test_inline_errors_open_the_circuit():
+    breaker = CircuitBreaker("db", failure_threshold=2)
+
+    def fail():
+        raise OSError("disk I/O error")
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            breaker.call(fail, timeout=1, inline=True)
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: None, timeout=1, inline=True)
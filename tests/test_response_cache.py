@@ -0,0 +1,47 @@
+import os
+import time
+from response_cache import ResponseCache, ORPHAN_GRACE_SECONDS
+
+QUOTE = {"function": "GLOBAL_QUOTE", "symbol": "AAPL"}
+
+def test_repeated_puts_for_one_key_stay_under_max_bytes(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=10 * 1024)
+
+    for _ in range(200):
+        cache.put(QUOTE, os.urandom(512))  # Incompressible, so every body is new
+
+    assert cache.size_bytes() <= cache.max_bytes
+    assert len(os.listdir(tmp_path / "entries")) == 1
+    assert len(os.listdir(tmp_path / "bodies")) == 1
+    assert cache.get(QUOTE) is not None
+
+def test_shared_body_is_kept_while_another_entry_uses_it(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    other = {"function": "GLOBAL_QUOTE", "symbol": "MSFT"}
+    cache.put(QUOTE, b"same payload")
+    cache.put(other, b"same payload")
+
+    cache.put(QUOTE, b"new payload")
+
+    assert cache.get(other).body == b"same payload"
+    assert cache.get(QUOTE).body == b"new payload"
+
+def test_evict_removes_orphaned_bodies_and_stale_temp_files(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.put(QUOTE, b"payload")
+    bodies = tmp_path / "bodies"
+    orphan = bodies / ("0" * 64 + ".z")
+    orphan.write_bytes(b"left behind")
+    temp = bodies / "abandoned.tmp"
+    temp.write_bytes(b"half written")
+    fresh_temp = bodies / "streaming.tmp"
+    fresh_temp.write_bytes(b"still streaming")
+    old = time.time() - ORPHAN_GRACE_SECONDS - 1
+    os.utime(orphan, (old, old))
+    os.utime(temp, (old, old))
+
+    cache.evict()
+
+    assert not orphan.exists() and not temp.exists()
+    assert fresh_temp.exists()
+    assert cache.get(QUOTE).body == b"payload"
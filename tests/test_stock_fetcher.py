@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta
+import database
+import stock_fetcher
+from price_store import int_to_date
+from stock_fetcher import fetch_stocks, lookup_cached, plan_quote_batches, estimate_api_calls, bulk_quotes_available, BULK_QUOTE_SIZE
+from stock_quote import StockQuote
+from storage_sqlite import SQLiteClient
+
+SYMBOLS = ["AAPL", "MSFT", "GOOGL"]
+
+def test_bulk_quotes_are_off_by_default(alpha_vantage, api_key, monkeypatch):
+    monkeypatch.setattr(stock_fetcher, "BULK_QUOTES_ENABLED", False)
+    assert plan_quote_batches(SYMBOLS, api_key) == [SYMBOLS]
+
+    results = fetch_stocks(SYMBOLS, api_key, None)
+
+    assert all(quote.ok for quote in results)
+    assert alpha_vantage.count("REALTIME_BULK_QUOTES") == 0
+    assert alpha_vantage.count("GLOBAL_QUOTE") == len(SYMBOLS)
+
+def test_premium_key_gets_quotes_from_one_bulk_call(alpha_vantage, api_key, monkeypatch):
+    monkeypatch.setattr(stock_fetcher, "BULK_QUOTES_ENABLED", True)
+    alpha_vantage.premium = True
+
+    results = fetch_stocks(SYMBOLS, api_key, None)
+
+    assert sorted(quote.symbol for quote in results) == sorted(SYMBOLS)
+    assert all(quote.current_price == 101.0 for quote in results)
+    assert alpha_vantage.count("REALTIME_BULK_QUOTES") == 1
+    assert alpha_vantage.count("GLOBAL_QUOTE") == 0
+
+def test_refused_bulk_call_falls_back_to_global_quote(alpha_vantage, api_key, monkeypatch):
+    monkeypatch.setattr(stock_fetcher, "BULK_QUOTES_ENABLED", True)
+
+    results = fetch_stocks(SYMBOLS, api_key, None)
+
+    assert all(quote.ok and quote.current_price == 100.0 for quote in results)
+    assert alpha_vantage.count("REALTIME_BULK_QUOTES") == 1
+    assert alpha_vantage.count("GLOBAL_QUOTE") == len(SYMBOLS)
+
+    # The refusal is remembered, so the next run goes straight to per-symbol quotes
+    assert not bulk_quotes_available(api_key)
+    fetch_stocks(["NVDA", "TSLA"], api_key, None)
+    assert alpha_vantage.count("REALTIME_BULK_QUOTES") == 1
+
+def test_quote_batches_follow_bulk_size(api_key, monkeypatch):
+    symbols = [f"S{i}" for i in range(2 * BULK_QUOTE_SIZE + 50)]
+
+    monkeypatch.setattr(stock_fetcher, "BULK_QUOTES_ENABLED", True)
+    assert [len(batch) for batch in plan_quote_batches(symbols, api_key)] == [BULK_QUOTE_SIZE, BULK_QUOTE_SIZE, 50]
+    assert estimate_api_calls(symbols, api_key) == 3 + len(symbols) * 2
+
+    monkeypatch.setattr(stock_fetcher, "BULK_QUOTES_ENABLED", False)
+    assert plan_quote_batches(symbols, api_key) == [symbols]
+    assert estimate_api_calls(symbols, api_key) == len(symbols) * 3
+    assert plan_quote_batches([], api_key) == []
+
+def test_first_load_keeps_full_weekly_history(alpha_vantage, api_key):
+    alpha_vantage.weeks = 5 * 52
+
+    [quote] = fetch_stocks(["AAPL"], api_key, None)
+
+    # The 52-week range only covers the latest window...
+    assert (quote.week_52_low, quote.week_52_high) == (90.0, 110.0)
+    assert len(stock_fetcher.weekly_bar_store.get("AAPL").bars) == 52
+    # ...while the price store gets every week, oldest first
+    history = stock_fetcher.weekly_bar_store.store.read("AAPL")
+    assert len(history["date"]) == 5 * 52
+    assert list(history["date"]) == sorted(history["date"])
+    assert history["high"][0] == 500.0
+
+def test_catching_up_after_a_long_gap_leaves_no_hole_in_history(alpha_vantage, api_key):
+    fetch_stocks(["AAPL"], api_key, None)
+
+    # The symbol is next loaded 100 weeks later, well past the 52-week window
+    alpha_vantage.last_week += timedelta(weeks=100)
+    [quote] = fetch_stocks(["AAPL"], api_key, None)
+
+    assert (quote.week_52_low, quote.week_52_high) == (90.0, 110.0)
+    days = [date.fromisoformat(int_to_date(day)) for day in stock_fetcher.weekly_bar_store.store.read("AAPL")["date"]]
+    assert len(days) == alpha_vantage.weeks + 100
+    assert all(later - earlier == timedelta(weeks=1) for earlier, later in zip(days, days[1:]))
+
+def test_bad_api_key_is_not_cached_as_invalid_symbol(alpha_vantage, api_key):
+    alpha_vantage.bad_keys.add(api_key)
+
+    results = fetch_stocks(SYMBOLS, api_key, None)
+
+    assert all(quote.status == "error" and "apikey" in quote.error for quote in results)
+    assert all(stock_fetcher.negative_cache.lookup(symbol) is None for symbol in SYMBOLS)
+
+    # The same symbols still work for a valid key
+    alpha_vantage.bad_keys.clear()
+    assert all(quote.ok for quote in fetch_stocks(SYMBOLS, api_key, None))
+
+def test_invalid_symbol_is_not_retried(alpha_vantage, api_key):
+    alpha_vantage.invalid_symbols.add("NOPE")
+
+    [first] = fetch_stocks(["NOPE"], api_key, None)
+    calls = len(alpha_vantage.calls)
+    [second] = fetch_stocks(["NOPE"], api_key, None)
+
+    assert first.error.startswith("Invalid API call")
+    assert second.failure_kind == "invalid"
+    assert len(alpha_vantage.calls) == calls
+
+def test_cache_hits_count_as_views(alpha_vantage, api_key, tmp_path):
+    db = SQLiteClient(str(tmp_path / "stock_tracker.db"))
+    database.cache_stock_data(db, "VIEWED", StockQuote("VIEWED", current_price=100.0, week_52_low=90.0, week_52_high=110.0, company_name="Viewed Inc", updated_at=datetime.now()))
+    tracker = database._popularity_tracker(db)
+    before = tracker.pending_count()
+
+    hits, misses = lookup_cached(["VIEWED"], api_key, db)
+
+    assert [quote.symbol for quote in hits] == ["VIEWED"] and misses == []
+    assert tracker.pending_count() == before + 1
+
+    # A cache hit inside a fetch run is counted once, not again by the run
+    fetch_stocks(["VIEWED"], api_key, db)
+    assert tracker.pending_count() == before + 2
+    assert database.get_popular_stocks(db, 1)[0]["symbol"] == "VIEWED"
+    assert alpha_vantage.calls == []
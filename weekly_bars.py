@@ -0,0 +1,184 @@
+import threading
+from collections import deque
+from datetime import date, timedelta
+from price_store import price_store, int_to_date
+
+WINDOW_WEEKS = 52
+HISTORY_CHUNK_BARS = 1000  # Bars written to the price store per append
+
+class SlidingRange:
+    """High/low over the most recent `size` bars, kept with monotonic deques.
+
+    Each bar is pushed and popped at most once, so adding a bar is O(1)
+    amortized and reading the high or low is O(1).
+    """
+
+    def __init__(self, size=WINDOW_WEEKS):
+        self.size = size
+        self.count = 0
+        self._highs = deque()  # (index, high) with decreasing highs
+        self._lows = deque()   # (index, low) with increasing lows
+
+    def push(self, high, low):
+        index = self.count
+        self.count += 1
+
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((index, high))
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((index, low))
+
+        # Drop bars that slid out of the window
+        oldest = index - self.size
+        while self._highs[0][0] <= oldest:
+            self._highs.popleft()
+        while self._lows[0][0] <= oldest:
+            self._lows.popleft()
+
+    @property
+    def high(self):
+        return self._highs[0][1] if self._highs else None
+
+    @property
+    def low(self):
+        return self._lows[0][1] if self._lows else None
+
+def week_start(day):
+    """ISO date of the Monday in the week of `day`"""
+    day = date.fromisoformat(day)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+def _same_week(a, b):
+    return date.fromisoformat(a).isocalendar()[:2] == date.fromisoformat(b).isocalendar()[:2]
+
+class SymbolBars:
+    """Latest 52 weekly bars for one symbol, oldest first, as (date, open, high, low, close) tuples.
+
+    Older history stays in the columnar price store.
+    """
+
+    def __init__(self, bars=None):
+        self.bars = list(bars or [])[-WINDOW_WEEKS:]
+        self._rebuild_range()
+
+    def _rebuild_range(self):
+        self.range = SlidingRange()
+        for bar in self.bars[-WINDOW_WEEKS:]:
+            self.range.push(bar[2], bar[3])
+
+    @property
+    def last_date(self):
+        return self.bars[-1][0] if self.bars else None
+
+    def merge(self, new_bars):
+        """Add bars (oldest first) newer than what we have.
+
+        Returns the changes as ("append" | "replace", bar) pairs, in order,
+        so they can be applied to the persistent store.
+        """
+        changes = []
+        for bar in new_bars:
+            last = self.last_date
+            if last is None or bar[0] > last:
+                if last is not None and _same_week(bar[0], last):
+                    # The current week's bar moves forward every trading day; replacing
+                    # it means re-scanning the 52-bar window, which is constant work
+                    self.bars[-1] = bar
+                    self._rebuild_range()
+                    changes.append(("replace", bar))
+                else:
+                    self.bars.append(bar)
+                    self.range.push(bar[2], bar[3])
+                    changes.append(("append", bar))
+            elif bar[0] == last and bar != self.bars[-1]:
+                self.bars[-1] = bar
+                self._rebuild_range()
+                changes.append(("replace", bar))
+        del self.bars[:-WINDOW_WEEKS]
+        return changes
+
+def weekly_bar(day, values):
+    """(date, open, high, low, close) bar for one Alpha Vantage time series entry"""
+    return (
+        day,
+        float(values["1. open"]),
+        float(values["2. high"]),
+        float(values["3. low"]),
+        float(values["4. close"]),
+    )
+
+def parse_weekly_bars(time_series, since=None):
+    """Turn an Alpha Vantage weekly series into bars, oldest first.
+
+    With `since`, only bars from that date's week onwards are kept, so just
+    the handful of new entries get sorted instead of the whole history.
+    """
+    cutoff = week_start(since) if since else None
+
+    bars = []
+    for day, values in time_series.items():
+        if cutoff and day < cutoff:
+            continue
+        bars.append(weekly_bar(day, values))
+    bars.sort()
+    return bars
+
+class WeeklyBarStore:
+    """Process-wide latest weekly bars per symbol, backed by the columnar price store"""
+
+    def __init__(self, store=price_store):
+        self.store = store
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        """Bars for `symbol`, loaded from the price store on first use"""
+        with self._lock:
+            if symbol not in self._symbols:
+                bars = []
+                try:
+                    columns = self.store.tail(symbol, WINDOW_WEEKS)
+                    bars = [
+                        (int_to_date(day), round(float(o), 4), round(float(h), 4), round(float(l), 4), round(float(c), 4))
+                        for day, o, h, l, c in zip(columns["date"], columns["open"], columns["high"], columns["low"], columns["close"])
+                    ]
+                except (OSError, ValueError):
+                    pass
+                self._symbols[symbol] = SymbolBars(bars)
+            return self._symbols[symbol]
+
+    def update(self, symbol, new_bars, history=()):
+        """Merge new bars and return the (low, high) of the latest 52 weeks.
+
+        `history` holds bars older than `new_bars` (oldest first), read past
+        the 52-week window on a first load or after a long gap; they are
+        merged the same way, so they reach the price store without gaps.
+        """
+        symbol_bars = self.get(symbol)
+        with self._lock:
+            changes = symbol_bars.merge(list(history) + list(new_bars))
+            low, high = symbol_bars.range.low, symbol_bars.range.high
+        self._save(symbol, changes)
+        return low, high
+
+    def _append(self, symbol, bars):
+        for i in range(0, len(bars), HISTORY_CHUNK_BARS):
+            self.store.append(symbol, bars[i:i + HISTORY_CHUNK_BARS])
+
+    def _save(self, symbol, changes):
+        try:
+            appends = []
+            for action, bar in changes:
+                if action == "append":
+                    appends.append(bar)
+                    continue
+                self._append(symbol, appends)
+                appends = []
+                self.store.replace_last(symbol, bar)
+            self._append(symbol, appends)
+        except (OSError, ValueError):
+            pass  # The in-memory bars are still good for this process
+
+weekly_bar_store = WeeklyBarStore()
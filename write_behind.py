@@ -0,0 +1,89 @@
+import atexit
+import threading
+import time
+
+class WriteBehindBuffer:
+    """Queue rows and write them in batches from a background thread.
+
+    Rows are coalesced by key, so only the latest row per key is written.
+    A flush happens when `max_rows` rows are pending or the oldest pending
+    row has waited `max_delay` seconds, and once more at interpreter exit.
+    A failed flush puts its rows back (unless newer rows arrived for the
+    same keys) and is retried after `retry_delay` seconds.
+    """
+
+    def __init__(self, write_rows, max_rows=25, max_delay=2.0, retry_delay=30.0, name="write-behind"):
+        self.write_rows = write_rows
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.last_error = None
+        self._pending = {}
+        self._first_added = None
+        self._retry_at = 0.0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def add(self, key, row):
+        with self._cond:
+            self._pending[key] = row
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+                self._cond.notify()  # Start the max_delay timer
+            elif len(self._pending) >= self.max_rows:
+                self._cond.notify()
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _seconds_until_due(self):
+        """0 if a flush is due now, otherwise how long to wait (None means no pending rows)"""
+        if not self._pending:
+            return None
+        now = time.monotonic()
+        if len(self._pending) >= self.max_rows:
+            due_at = self._retry_at
+        else:
+            due_at = max(self._first_added + self.max_delay, self._retry_at)
+        return max(0.0, due_at - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                wait = self._seconds_until_due()
+                while wait is None or wait > 0:
+                    self._cond.wait(wait)
+                    wait = self._seconds_until_due()
+            self.flush()
+
+    def flush(self):
+        """Write all pending rows now; return False if the write failed"""
+        with self._flush_lock:
+            with self._cond:
+                rows = self._pending
+                self._pending = {}
+                self._first_added = None
+            if not rows:
+                return True
+
+            try:
+                self.write_rows(list(rows.values()))
+                self.flushed_rows += len(rows)
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.failed_flushes += 1
+                self.last_error = str(e)
+                with self._cond:
+                    for key, row in rows.items():
+                        self._pending.setdefault(key, row)
+                    if self._first_added is None:
+                        self._first_added = time.monotonic()
+                    self._retry_at = time.monotonic() + self.retry_delay
+                return False